@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+import pandas as pd
+from functions.content import (
+    get_head,
+    get_twitter_description,
+    get_twitter_description_full_page,
+)
+from functions.http_cache import make_response
+from functions.media import France_Info, Le_Parisien, Le_Monde, Lexpress, Liberation
+from functions.parsers import PARSERS
+from functions.storage import save_shard
+from functions.word_trends import get_counts
+
+FIXTURES = "benchmarks/fixtures"
+RESULTS = "benchmarks/results.jsonl"
+# Archive page of one day of each outlet, replayed for every day and page
+OUTLETS = {
+    "france_info": France_Info,
+    "le_parisien": Le_Parisien,
+    "le_monde": Le_Monde,
+    "lexpress": Lexpress,
+    "liberation": Liberation,
+}
+TREND_KEYWORDS = ["covid", "vaccin", "confinement", "masque", "ukraine", "retraites"]
+WORDS = (
+    "le la les un une des du de en au aux pour sur avec dans par contre après avant "
+    "gouvernement président ministre hôpital école réforme élection prix énergie "
+    "guerre ukraine retraites masque confinement vaccin couvre-feu télétravail "
+    "annonce prolonge suspend réclame confirme lève durcit prépare dément"
+).split()
+COVID_WORDS = ["covid", "Covid-19", "coronavirus", "2019-nCoV"]
+
+
+class Fixture_Session:
+    """Serve the same recorded page for every url, like requests.Session.get"""
+
+    def __init__(self, content) -> None:
+        self.content = content
+        self.n_requests = 0
+
+    def get(self, url, **kwargs):
+        self.n_requests += 1
+        headers = {"content-type": "text/html; charset=utf-8"}
+        return make_response(url, 200, self.content, headers)
+
+
+def read_fixture(name, folder=FIXTURES):
+    with open(f"{folder}/{name}.html", "rb") as f:
+        return f.read()
+
+
+def synthetic_titles(n, seed=0, covid_share=0.1):
+    """Headlines drawn from a small vocabulary, some of them about COVID"""
+    rng = random.Random(seed)
+    list_title = []
+    for i in range(n):
+        words = rng.choices(WORDS, k=rng.randint(6, 14))
+        if rng.random() < covid_share:
+            words.insert(rng.randrange(len(words)), rng.choice(COVID_WORDS))
+        list_title.append(" ".join(words).capitalize())
+    return list_title
+
+
+def synthetic_day(date, n_rows, seed=0):
+    """Frame of one day, indexed (date, rank) like get_papers_one_day"""
+    titles = synthetic_titles(n_rows, seed=seed)
+    urls = [f"https://example.org/{seed}/{i}" for i in range(n_rows)]
+    df = pd.DataFrame({"title": titles, "url": urls})
+    return pd.concat([df], axis=0, keys=[date])
+
+
+def timed(function, repeat=1):
+    """Best time of a few runs, and the result of the last one"""
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def bench_parsers(fixtures, repeat=5):
+    list_record = []
+    for outlet in OUTLETS:
+        content = fixtures[outlet]
+        soup_parser, fast_parser = PARSERS[outlet]
+        for parser_name, parser in [("soup", soup_parser), ("fast", fast_parser)]:
+            seconds, list_info = timed(lambda: parser(content), repeat=repeat)
+            list_record.append(
+                {
+                    "benchmark": "parse_page",
+                    "outlet": outlet,
+                    "parser": parser_name,
+                    "size": len(content),
+                    "rows": len(list_info),
+                    "seconds": seconds,
+                    "same": fast_parser(content) == soup_parser(content),
+                }
+            )
+    return list_record
+
+
+def bench_get_papers(fixtures, n_days):
+    """get_papers_one_day on n_days days, pages served from the fixtures"""
+    list_record = []
+    list_date = pd.date_range(start="2020-03-01", periods=n_days, freq="D")
+    for outlet, media_class in OUTLETS.items():
+        media = media_class(folder_name=f"bench_{outlet}", cache=False)
+        media.request_session = Fixture_Session(fixtures[outlet])
+        n_rows = 0
+        start = time.perf_counter()
+        for date in list_date:
+            df = media.get_papers_one_day(date=date)
+            n_rows += df.shape[0]
+        seconds = time.perf_counter() - start
+        list_record.append(
+            {
+                "benchmark": "get_papers_one_day",
+                "outlet": outlet,
+                "size": n_days,
+                "pages": media.request_session.n_requests,
+                "rows": n_rows,
+                "seconds": seconds,
+                "pages_per_second": media.request_session.n_requests / seconds,
+                "rows_per_second": n_rows / seconds,
+            }
+        )
+    return list_record
+
+
+def bench_load_data(n_days, n_rows=150, storage="parquet"):
+    """load_data from scratch, with nothing new, and after one day changed"""
+    media = France_Info(folder_name=f"bench_load_{storage}_{n_days}", cache=False)
+    media.storage = storage
+    list_date = pd.date_range(start="2020-02-01", periods=n_days, freq="D")
+    for i, date in enumerate(list_date):
+        save_shard(synthetic_day(date, n_rows, seed=i), media.path, date, storage)
+    list_record = []
+    for case in ["cold", "warm", "one_day_changed"]:
+        if case == "one_day_changed":
+            date = list_date[n_days // 2]
+            save_shard(synthetic_day(date, n_rows, seed=-1), media.path, date, storage)
+        seconds, result = timed(media.load_data)
+        list_record.append(
+            {
+                "benchmark": "load_data",
+                "storage": storage,
+                "case": case,
+                "size": n_days,
+                "rows": media.dataframe.shape[0],
+                "seconds": seconds,
+            }
+        )
+    return list_record
+
+
+def bench_description(content, repeat=5):
+    """Description of an article from the whole page and soup, or from the head"""
+    url = "https://www.example.org/article.html"
+    # Bytes read: the whole page, or the chunks up to </head>
+    head = get_head(Fixture_Session(content), url)
+    list_method = [
+        ("full_page", get_twitter_description_full_page, len(content)),
+        ("head_only", get_twitter_description, len(head)),
+    ]
+    expected = get_twitter_description_full_page(Fixture_Session(content), url)
+    list_record = []
+    for method, get_description, n_bytes in list_method:
+        session = Fixture_Session(content)
+        seconds, description = timed(lambda: get_description(session, url), repeat)
+        list_record.append(
+            {
+                "benchmark": "description_fetch",
+                "method": method,
+                "size": len(content),
+                "bytes": n_bytes,
+                "seconds": seconds,
+                "same": description == expected,
+            }
+        )
+    return list_record
+
+
+def bench_covid(n_titles, repeat=3):
+    media = France_Info(folder_name="bench_covid", cache=False)
+    titles = synthetic_titles(n_titles, seed=n_titles)
+    list_record = []
+    for hits in [False, True]:
+        media.dataframe = pd.DataFrame({"title": titles})
+        seconds, result = timed(lambda: media.is_COVID_related(hits=hits), repeat)
+        list_record.append(
+            {
+                "benchmark": "is_COVID_related",
+                "hits": hits,
+                "size": n_titles,
+                "related": int(media.dataframe.COVID_related.sum()),
+                "seconds": seconds,
+                "rows_per_second": n_titles / seconds,
+            }
+        )
+    return list_record
+
+
+def bench_trends(n_titles, repeat=3):
+    titles = pd.Series(synthetic_titles(n_titles, seed=n_titles))
+    seconds, df_trend = timed(lambda: get_counts(titles, TREND_KEYWORDS), repeat)
+    return [
+        {
+            "benchmark": "get_counts",
+            "size": n_titles,
+            "keywords": len(TREND_KEYWORDS),
+            "seconds": seconds,
+            "rows_per_second": n_titles / seconds,
+        }
+    ]
+
+
+def git_commit():
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+
+def run_benchmarks(
+    output=RESULTS,
+    list_days=(7, 30),
+    list_load_days=(30, 120, 365),
+    list_titles=(1_000, 10_000, 100_000),
+    fixtures_folder=FIXTURES,
+):
+    """Run every benchmark offline and append one JSON line per measure to output
+
+    The data/ folders are written in a temporary directory, the records carry
+    the commit so that results of several commits can be compared.
+    """
+    fixtures = {outlet: read_fixture(outlet, fixtures_folder) for outlet in OUTLETS}
+    article = read_fixture("article", fixtures_folder)
+    output = os.path.abspath(output)
+    header = {
+        "commit": git_commit(),
+        "time": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+    }
+    cwd = os.getcwd()
+    list_record = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            os.mkdir("data")
+            list_record += bench_parsers(fixtures)
+            list_record += bench_description(article)
+            for n_days in list_days:
+                list_record += bench_get_papers(fixtures, n_days)
+            for n_days in list_load_days:
+                for storage in ["parquet", "pickle"]:
+                    list_record += bench_load_data(n_days, storage=storage)
+            for n_titles in list_titles:
+                list_record += bench_covid(n_titles)
+                list_record += bench_trends(n_titles)
+        finally:
+            os.chdir(cwd)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "a") as f:
+        for record in list_record:
+            f.write(json.dumps({**header, **record}) + "\n")
+    return pd.DataFrame(list_record)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the pipeline")
+    parser.add_argument("--output", default=RESULTS)
+    parser.add_argument("--quick", action="store_true", help="smallest sizes only")
+    args = parser.parse_args()
+    if args.quick:
+        df = run_benchmarks(
+            args.output, list_days=(3,), list_load_days=(30,), list_titles=(1_000,)
+        )
+    else:
+        df = run_benchmarks(args.output)
+    print(df.to_string())
@@ -0,0 +1,116 @@
+import pandas as pd
+from functions.covid import COVID_KEYWORDS, classify_titles
+from functions.storage import list_shards, read_shard
+from functions.word_trends import get_counts, resample_freq
+
+
+def iter_chunks(path, columns=None, start_date=None, end_date=None, max_rows=100_000):
+    """Frames of consecutive day shards of a folder, about max_rows rows each
+
+    Days are never split, a day larger than max_rows is a chunk of its own.
+    """
+    shards = list_shards(path)
+    files = pd.Series(list(shards.values()), index=pd.to_datetime(list(shards)))
+    # Same bounds as .loc on the dates, so "2020-03" includes the whole month
+    files = files.loc[start_date:end_date]
+    list_df, n_rows = [], 0
+    for file in files:
+        df = read_shard(file, columns=columns)
+        list_df.append(df)
+        n_rows += df.shape[0]
+        if n_rows >= max_rows:
+            yield pd.concat(list_df)
+            list_df, n_rows = [], 0
+    if list_df:
+        yield pd.concat(list_df)
+
+
+def day_index(df):
+    return pd.to_datetime(df.index.get_level_values(0)).normalize()
+
+
+def merge_partials(list_df):
+    """Sum of the aggregates of several chunks, day by day"""
+    list_df = [df for df in list_df if not df.empty]
+    if not list_df:
+        return pd.DataFrame()
+    return pd.concat(list_df).groupby(level=0).sum().sort_index()
+
+
+class Chunked_Corpus:
+    """Day shards of several outlets, analysed chunk by chunk
+
+    Each chunk is reduced to sums per day before the next one is read, so the
+    memory needed depends on max_rows and not on the size of the archive.
+    query has the signature of Daily_Rollup.query, for analyse_trends.
+    """
+
+    def __init__(self, list_media, column="title", max_rows=100_000) -> None:
+        self.paths = {media.outlet: media.path for media in list_media}
+        # Text that is analysed, e.g. "description" for the outlets that have it
+        self.column = column
+        self.max_rows = max_rows
+
+    def chunks(self, outlets=None, start_date=None, end_date=None):
+        """(outlet, texts) of every chunk, one outlet after the other"""
+        for outlet in self.paths if outlets is None else outlets:
+            for df in iter_chunks(
+                self.paths[outlet],
+                columns=[self.column],
+                start_date=start_date,
+                end_date=end_date,
+                max_rows=self.max_rows,
+            ):
+                texts = df[self.column].fillna("").astype(str)
+                texts.index = day_index(df)
+                yield outlet, texts
+
+    def query(
+        self,
+        keywords,
+        freq="M",
+        normalized=True,
+        outlets=None,
+        start_date=None,
+        end_date=None,
+    ):
+        """Mean of get_counts per period, as plot_trends draws it
+
+        Each chunk gives the sum and the number of values per day (titles
+        with a NaN value, the empty ones when normalized, are left out of
+        both like mean does).
+        """
+        list_sum, list_count = [], []
+        for outlet, texts in self.chunks(outlets, start_date, end_date):
+            df_trend = get_counts(texts, keywords, normalized=normalized)
+            list_sum.append(df_trend.groupby(level=0).sum())
+            list_count.append(df_trend.groupby(level=0).count())
+        if not list_sum:
+            return pd.DataFrame(columns=list(keywords), dtype=float)
+        freq = resample_freq(freq)
+        total = merge_partials(list_sum).resample(freq).sum()
+        n_values = merge_partials(list_count).resample(freq).sum()
+        # Periods without any value are NaN, as the mean of nothing
+        return total / n_values.where(n_values > 0)
+
+    def covid(
+        self,
+        keywords=COVID_KEYWORDS,
+        hits=False,
+        outlets=None,
+        start_date=None,
+        end_date=None,
+    ):
+        """Per outlet and day: n_docs, number of COVID_related documents and,
+        with hits, the total of each n_<keyword> column of classify_titles
+        """
+        list_df = []
+        for outlet, texts in self.chunks(outlets, start_date, end_date):
+            df_covid = classify_titles(texts, keywords=keywords, hits=hits)
+            df_covid.insert(0, "n_docs", 1)
+            df_day = merge_partials([df_covid.astype("int64")])
+            list_df.append(pd.concat({outlet: df_day}, names=["outlet", "date"]))
+        if not list_df:
+            return pd.DataFrame()
+        # Days are not split between chunks, every (outlet, date) is there once
+        return pd.concat(list_df)
@@ -0,0 +1,141 @@
+"""Crawl the days not downloaded yet, e.g. from cron
+
+    python -m functions.cli france_info le_parisien --workers 4
+    python -m functions.cli le_monde --start-date 2024-01-01 --full --dry-run
+
+pandas, requests and the parsers are only imported once there is a day to crawl.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import datetime
+from importlib import import_module
+
+# Data folder -> class of functions.media
+OUTLETS = {
+    "france_info": "France_Info",
+    "le_parisien": "Le_Parisien",
+    "le_monde": "Le_Monde",
+    "lexpress": "Lexpress",
+    "liberation": "Liberation",
+}
+SHARD = re.compile(r"^df_(\d{4}-\d{2}-\d{2})\.(pkl|parquet)$")
+UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(size):
+    """Bytes of a size like 500M or 2G"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([KMG]?)B?", size.strip().upper())
+    if match is None:
+        raise argparse.ArgumentTypeError(f"invalid size: {size}")
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+def list_shard_dates(path):
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        datetime.date.fromisoformat(match.group(1))
+        for match in map(SHARD.match, os.listdir(path))
+        if match
+    )
+
+
+def days_to_crawl(outlet, start_date, end_date, full=False, retry=False):
+    """Days after the newest shard (tail), or every missing day with full"""
+    path = f"data/{outlet}"
+    list_shard = list_shard_dates(path)
+    if list_shard and not full:
+        start_date = max(start_date, list_shard[-1] + datetime.timedelta(days=1))
+    # Days in the ledger are skipped by download_all unless retried
+    ledger = {}
+    if not retry and os.path.isfile(f"{path}/failed_days.json"):
+        with open(f"{path}/failed_days.json") as f:
+            ledger = json.load(f)
+    set_shard = set(list_shard)
+    list_date = []
+    date = start_date
+    while date <= end_date:
+        if date not in set_shard and date.isoformat() not in ledger:
+            list_date.append(date)
+        date += datetime.timedelta(days=1)
+    return list_date
+
+
+def parse_args(argv=None):
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("outlets", nargs="+", choices=list(OUTLETS))
+    parser.add_argument(
+        "--start-date", type=datetime.date.fromisoformat, default="2020-02-01"
+    )
+    # Today's archive is not complete yet, and Le Monde needs the next day
+    parser.add_argument(
+        "--end-date", type=datetime.date.fromisoformat, default=yesterday
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="every missing day, not only the tail"
+    )
+    parser.add_argument("--retry", action="store_true", help="retry failed days")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--parsers", type=int, default=0, help="parse processes")
+    parser.add_argument("--max-per-host", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--storage", choices=["parquet", "pickle"], default="parquet")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument(
+        "--cache-max-bytes",
+        type=parse_size,
+        default="2G",
+        help="size of data/http_cache before the least recently used are evicted",
+    )
+    parser.add_argument("--tor-ports", type=int, nargs="+", default=[9050])
+    parser.add_argument("--prom-dir", help="folder of the Prometheus textfiles")
+    parser.add_argument("--dry-run", action="store_true", help="only list the days")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    n_failed = 0
+    for outlet in args.outlets:
+        list_date = days_to_crawl(
+            outlet, args.start_date, args.end_date, full=args.full, retry=args.retry
+        )
+        print(f"{outlet}: {len(list_date)} days to crawl")
+        if args.dry_run and list_date:
+            print(" ".join(date.isoformat() for date in list_date))
+        if not list_date or args.dry_run:
+            continue
+        media_module = import_module("functions.media")
+        kwargs = {
+            "storage": args.storage,
+            "cache": not args.no_cache,
+            "cache_max_bytes": args.cache_max_bytes,
+        }
+        if outlet == "le_monde":
+            kwargs["tor_ports"] = tuple(args.tor_ports)
+        media = getattr(media_module, OUTLETS[outlet])(
+            start_date=str(list_date[0]), end_date=str(args.end_date), **kwargs
+        )
+        prom_file = None
+        if args.prom_dir is not None:
+            prom_file = f"{args.prom_dir}/archive_{outlet}.prom"
+        media.download_all(
+            retry=args.retry,
+            n_workers=args.workers,
+            max_per_host=args.max_per_host,
+            delay=args.delay,
+            prom_file=prom_file,
+            n_parsers=args.parsers,
+        )
+        ledger = import_module("functions.crawl").read_ledger(media)
+        n_failed += sum(date.isoformat() in ledger for date in list_date)
+    # Non zero exit code so that cron reports the days that failed in this run
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pyprind
+from functions.crawl import polite_session
+from functions.parsers import scan_twitter_description, soup_twitter_description
+
+HEAD_END = re.compile(rb"</head\s*>", re.I)
+
+
+def read_checkpoints(folder):
+    """Contents already downloaded, url -> content"""
+    contents = {}
+    if os.path.isdir(folder):
+        for file in sorted(os.listdir(folder)):
+            if file.startswith("batch_") and file.endswith(".parquet"):
+                df = pd.read_parquet(f"{folder}/{file}")
+                contents.update(zip(df.url, df.content))
+    return contents
+
+
+def get_head(request_session, url_full, chunk_size=16384, max_bytes=1024**2):
+    """Bytes of a page up to </head>, the body is never downloaded"""
+    r = request_session.get(url=url_full, stream=True)
+    try:
+        if r.status_code != 200:
+            raise Warning(f"Status code incorect: {r.status_code}")
+        head = b""
+        for chunk in r.iter_content(chunk_size=chunk_size):
+            # Only look for </head> around the new chunk
+            start = max(0, len(head) - len(HEAD_END.pattern))
+            head += chunk
+            match = HEAD_END.search(head, start)
+            if match:
+                return head[: match.end()]
+            if len(head) > max_bytes:
+                break
+        return head
+    finally:
+        r.close()
+
+
+def get_twitter_description(request_session, url_full):
+    """Download the "chapeau" of the article, reading the page up to </head>"""
+    head = get_head(request_session, url_full)
+    return scan_twitter_description(head)
+
+
+def get_twitter_description_full_page(request_session, url_full):
+    """Former path: whole page and a full tree"""
+    r = request_session.get(url=url_full)
+    if r.status_code != 200:
+        raise Warning(f"Status code incorect: {r.status_code}")
+    return soup_twitter_description(r.content)
+
+
+def fetch_contents(
+    media,
+    list_url,
+    folder,
+    get_content=get_twitter_description,
+    n_workers=8,
+    batch_size=500,
+    max_per_host=4,
+    delay=0.5,
+):
+    """Download get_content of every url, saving a checkpoint per batch
+
+    Urls already in a checkpoint of folder are skipped, so an interrupted run
+    resumes from its last batch. Failed urls are left out and tried again on
+    the next run.
+    """
+    os.makedirs(folder, exist_ok=True)
+    contents = read_checkpoints(folder)
+    list_todo = list(dict.fromkeys(url for url in list_url if url not in contents))
+    # After the last batch on disk, a missing number must not overwrite one
+    n_batch = max(
+        [
+            int(file[len("batch_") : -len(".parquet")])
+            for file in os.listdir(folder)
+            if file.startswith("batch_") and file.endswith(".parquet")
+        ],
+        default=0,
+    )
+    bar = pyprind.ProgBar(max(len(list_todo), 1))
+
+    def get_one(url):
+        try:
+            content = get_content(media.request_session, url)
+        except Exception:
+            content = None
+        bar.update()
+        return content
+
+    with polite_session(media, n_workers, max_per_host, delay):
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            for start in range(0, len(list_todo), batch_size):
+                list_batch = list_todo[start : start + batch_size]
+                list_content = list(executor.map(get_one, list_batch))
+                df = pd.DataFrame({"url": list_batch, "content": list_content})
+                df = df[df.content.notna()]
+                n_batch += 1
+                file = f"{folder}/batch_{n_batch:05d}.parquet"
+                # A run killed while writing leaves a .tmp, not a truncated batch
+                df.to_parquet(f"{file}.tmp", index=False)
+                os.replace(f"{file}.tmp", file)
+                contents.update(zip(df.url, df.content))
+    return contents
+
+
+def load_content(media, url_base="", n_workers=8, batch_size=500):
+    """COVID related papers of media.dataframe with the content of each article"""
+    file = f"{media.path}/DF_with_content.pkl"
+    if not os.path.isfile(file):
+        df = media.dataframe
+        df = df[df.COVID_related].copy()
+        list_url = (url_base + df.url).tolist()
+        contents = fetch_contents(
+            media,
+            list_url,
+            folder=f"{media.path}/content",
+            n_workers=n_workers,
+            batch_size=batch_size,
+        )
+        n_missing = len([url for url in list_url if url not in contents])
+        if n_missing:
+            raise Warning(f"{n_missing} articles failed, run again to retry them")
+        df["content"] = [contents[url] for url in list_url]
+        df.to_pickle(file)
+    df = pd.read_pickle(file)
+    return df
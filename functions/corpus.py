@@ -0,0 +1,79 @@
+import pandas as pd
+from functions.storage import load_dataset
+
+# Scheme and host of an url, "" for the relative urls of France Info
+URL_PREFIX = r"^(https?://[^/]+/)?"
+ARROW_STRING = pd.StringDtype("pyarrow")
+
+
+def memory(df):
+    """Bytes of a frame, strings and index included"""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def compact(DF, outlet):
+    """(date, rank) frame of one outlet -> date indexed frame with small dtypes"""
+    df = DF.reset_index(names=["date", "rank"])
+    df["date"] = pd.to_datetime(df["date"])
+    df["rank"] = pd.to_numeric(df["rank"], downcast="integer")
+    df.insert(0, "outlet", outlet)
+    if "url" in df.columns:
+        url = df.pop("url").astype(ARROW_STRING)
+        prefix = url.str.extract(URL_PREFIX, expand=False).fillna("")
+        df["url_prefix"] = prefix.astype("category")
+        df["url_path"] = url.str.replace(URL_PREFIX, "", regex=True)
+    for column in ["title", "description"]:
+        if column in df.columns:
+            df[column] = df[column].astype(ARROW_STRING)
+    return df.set_index("date")
+
+
+def url_full(df):
+    """Urls of a compact frame, as they were before factoring out the prefix"""
+    return df.url_prefix.astype(ARROW_STRING) + df.url_path
+
+
+def load_corpus(list_media, columns=None, start_date=None, end_date=None):
+    """Every outlet in one date indexed frame, outlet as a categorical column
+
+    Strings are stored in Arrow buffers and the host part of the urls is kept
+    once per outlet (url_prefix); url_full gives back the complete urls.
+    Memory is printed before (frames of load_data) and after.
+    """
+    list_outlet = [media.outlet for media in list_media]
+    list_df = []
+    bytes_before = 0
+    for media in list_media:
+        DF = load_dataset(
+            media.path,
+            media.outlet,
+            storage=media.storage,
+            columns=columns,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        bytes_before += memory(DF)
+        # Converted one outlet at a time so that a single raw frame is in memory
+        list_df.append(compact(DF, media.outlet))
+        del DF
+    list_prefix = sorted(
+        set().union(
+            *(df.url_prefix.cat.categories for df in list_df if "url_prefix" in df)
+        )
+    )
+    for df in list_df:
+        df["outlet"] = pd.Categorical(df["outlet"], categories=list_outlet)
+        if "url_prefix" in df.columns:
+            # Same categories everywhere, otherwise concat falls back to objects
+            df["url_prefix"] = df["url_prefix"].cat.set_categories(list_prefix)
+    DF = pd.concat(list_df).sort_index(kind="stable")
+    # Columns missing from some outlets come out of concat as objects
+    for column in ["title", "description", "url_path"]:
+        if column in DF.columns:
+            DF[column] = DF[column].astype(ARROW_STRING)
+    bytes_after = memory(DF)
+    print(
+        f"Memory: {bytes_before / 1024**2:.1f} MB in {len(list_media)} frames -> "
+        f"{bytes_after / 1024**2:.1f} MB ({bytes_before / max(bytes_after, 1):.1f}x)"
+    )
+    return DF
@@ -0,0 +1,62 @@
+import re
+from functools import lru_cache
+import pandas as pd
+
+COVID_KEYWORDS = [
+    "covid",
+    "coronavirus",
+    "2019-nCoV",
+    "Covid-19",
+]  # "épidémie", "pandémie",
+
+
+def clean_keywords(keywords):
+    """Lower case, without duplicates, in the order given"""
+    return list(dict.fromkeys(kw.lower() for kw in keywords))
+
+
+@lru_cache(maxsize=None)
+def compile_keywords(keywords, capture=False):
+    """One case insensitive regex matching any of the keywords as a whole token"""
+    list_pattern = []
+    # Longest keyword first so that "covid-19" is not read as "covid"
+    for kw in sorted(clean_keywords(keywords), key=len, reverse=True):
+        start = r"\b" if re.match(r"\w", kw[0]) else ""
+        end = r"\b" if re.match(r"\w", kw[-1]) else ""
+        list_pattern.append(f"{start}{re.escape(kw)}{end}")
+    group = "(" if capture else "(?:"
+    # Without keywords the pattern would match the empty string, so every title
+    if not list_pattern:
+        list_pattern = ["(?!)"]
+    return f"(?i){group}{'|'.join(list_pattern)})"
+
+
+def count_keywords(titles, keywords=COVID_KEYWORDS):
+    """Number of hits of each keyword in each title, in one regex pass"""
+    keywords = clean_keywords(keywords)
+    pattern = compile_keywords(tuple(keywords), capture=True)
+    titles = titles.fillna("").reset_index(drop=True)
+    matches = titles.str.extractall(pattern)[0].str.lower()
+    df_hits = (
+        matches.groupby([matches.index.get_level_values(0), matches])
+        .size()
+        .unstack(fill_value=0)
+    )
+    df_hits = df_hits.reindex(
+        index=range(titles.shape[0]), columns=keywords, fill_value=0
+    )
+    return df_hits
+
+
+def classify_titles(titles, keywords=COVID_KEYWORDS, hits=False):
+    """COVID_related column, plus one n_<keyword> column per keyword if hits"""
+    df = pd.DataFrame(index=titles.index)
+    if hits:
+        df_hits = count_keywords(titles, keywords=keywords)
+        df["COVID_related"] = df_hits.sum(axis=1).to_numpy() > 0
+        for keyword in df_hits.columns:
+            df[f"n_{keyword}"] = df_hits[keyword].to_numpy()
+    else:
+        pattern = compile_keywords(tuple(keywords))
+        df["COVID_related"] = titles.fillna("").str.contains(pattern)
+    return df
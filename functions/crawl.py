@@ -0,0 +1,448 @@
+import os
+import json
+import time
+import queue
+import random
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+import pandas as pd
+import pyprind
+import requests
+from requests.adapters import HTTPAdapter
+from functions.http_cache import Cached_Session
+from functions.storage import save_shard, shard_exists
+
+
+class Host_Limiter:
+    """Limit the number of requests in flight per host and space them out"""
+
+    def __init__(self, max_per_host=4, delay=0.5) -> None:
+        self.max_per_host = max_per_host
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.next_request = {}
+
+    def acquire(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+        self.semaphores[host].acquire()
+        self.wait_delay(host)
+
+    def wait_delay(self, host):
+        # Politeness delay: requests to the same host start at least `delay` apart
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_request.get(host, now))
+            self.next_request[host] = start + self.delay
+        time.sleep(start - now)
+
+    def release(self, host):
+        self.semaphores[host].release()
+
+    def report(self, host, status_code, latency):
+        pass
+
+
+class AIMD_Limiter(Host_Limiter):
+    """Host_Limiter whose limit per host adapts to the responses
+
+    The limit grows by about one request per round of healthy responses and is
+    halved on a 429, a 5xx, a connection error or a latency above
+    latency_factor times the best latency seen on the host.
+    """
+
+    def __init__(
+        self,
+        max_per_host=16,
+        delay=0.5,
+        min_per_host=1,
+        start_per_host=2,
+        latency_factor=3.0,
+    ) -> None:
+        super().__init__(max_per_host, delay)
+        self.min_per_host = min_per_host
+        self.start_per_host = min(start_per_host, max_per_host)
+        self.latency_factor = latency_factor
+        self.condition = threading.Condition(self.lock)
+        self.limit = {}
+        self.in_flight = {}
+        self.latency = {}
+        self.best_latency = {}
+        self.last_decrease = {}
+
+    def acquire(self, host):
+        with self.condition:
+            self.limit.setdefault(host, self.start_per_host)
+            self.in_flight.setdefault(host, 0)
+            while self.in_flight[host] >= int(self.limit[host]):
+                self.condition.wait()
+            self.in_flight[host] += 1
+        self.wait_delay(host)
+
+    def release(self, host):
+        with self.condition:
+            self.in_flight[host] -= 1
+            self.condition.notify_all()
+
+    def report(self, host, status_code, latency):
+        with self.condition:
+            # Smoothed latency, compared with the best one seen
+            ewma = 0.8 * self.latency.get(host, latency) + 0.2 * latency
+            self.latency[host] = ewma
+            self.best_latency[host] = min(self.best_latency.get(host, ewma), ewma)
+            slow = ewma > self.latency_factor * self.best_latency[host]
+            if status_code is None or status_code == 429 or status_code >= 500 or slow:
+                # Requests of the same burst fail together: one decrease per round trip
+                now = time.monotonic()
+                if now - self.last_decrease.get(host, 0) > ewma:
+                    self.limit[host] = max(self.min_per_host, self.limit[host] / 2)
+                    self.last_decrease[host] = now
+            else:
+                self.limit[host] = min(
+                    self.max_per_host, self.limit[host] + 1 / self.limit[host]
+                )
+            self.condition.notify_all()
+
+
+def backoff_time(r, attempt, backoff=1.0):
+    """Retry-After if the server gives one, else a jittered exponential backoff"""
+    if r is not None and r.headers.get("Retry-After", "").isdigit():
+        return float(r.headers["Retry-After"])
+    return backoff * 2**attempt * random.uniform(0.5, 1.5)
+
+
+class Polite_Session:
+    """Wrap a session so that every get goes through a Host_Limiter
+
+    429, 5xx and connection errors are retried up to `retries` times. The time
+    of each attempt on the network, the wait for the limiter and the backoff
+    go to metrics (a Crawl_Metrics) when given.
+    """
+
+    def __init__(
+        self, request_session, limiter, retries=3, backoff=1.0, metrics=None
+    ) -> None:
+        self.request_session = request_session
+        self.limiter = limiter
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = metrics
+
+    def measure(self, **values):
+        if self.metrics is not None:
+            self.metrics.report_network(**values)
+
+    def get(self, url, **kwargs):
+        host = urlparse(url).netloc
+        for attempt in range(self.retries + 1):
+            r = None
+            start = time.monotonic()
+            self.limiter.acquire(host)
+            limiter_wait = time.monotonic() - start
+            start = time.monotonic()
+            try:
+                r = self.request_session.get(url=url, **kwargs)
+            except requests.RequestException:
+                latency = time.monotonic() - start
+                self.limiter.report(host, None, latency)
+                self.measure(latency=latency, limiter_wait=limiter_wait)
+                if attempt == self.retries:
+                    raise
+            else:
+                latency = time.monotonic() - start
+                self.limiter.report(host, r.status_code, latency)
+                self.measure(latency=latency, limiter_wait=limiter_wait)
+                failed = r.status_code == 429 or r.status_code >= 500
+                if not failed or attempt == self.retries:
+                    return r
+            finally:
+                self.limiter.release(host)
+            seconds = backoff_time(r, attempt, self.backoff)
+            self.measure(backoff=seconds)
+            time.sleep(seconds)
+
+    def __getattr__(self, name):
+        return getattr(self.request_session, name)
+
+
+def mount_pooled_adapter(session, pool_maxsize=10):
+    """Keep up to pool_maxsize connections open per host (no-op for RequestsTor)"""
+    if hasattr(session, "mount"):
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+
+def ledger_file(media):
+    return f"{media.path}/failed_days.json"
+
+
+def read_ledger(media):
+    """Days that failed, date -> error and number of attempts"""
+    if not os.path.isfile(ledger_file(media)):
+        return {}
+    with open(ledger_file(media)) as f:
+        return json.load(f)
+
+
+def write_ledger(media, ledger):
+    with open(ledger_file(media), "w") as f:
+        json.dump(ledger, f, indent=1, sort_keys=True)
+
+
+def list_missing_dates(media, retry=False):
+    """Days of media.list_date that have no df_YYYY-MM-DD shard yet
+
+    The days of the failure ledger are only included with retry=True.
+    """
+    ledger = read_ledger(media)
+    list_date = []
+    for date in media.list_date:
+        if not shard_exists(media.path, date):
+            if retry or date.strftime("%Y-%m-%d") not in ledger:
+                list_date.append(date)
+    return list_date
+
+
+@contextmanager
+def polite_session(media, n_workers=8, max_per_host=4, delay=0.5):
+    """Put an AIMD_Limiter under the cache of media.request_session for a while"""
+    # Only the requests that miss the cache go through the limiter
+    owner = media
+    while isinstance(owner.request_session, Cached_Session):
+        owner = owner.request_session
+    session = owner.request_session
+    mount_pooled_adapter(session, pool_maxsize=n_workers)
+    owner.request_session = Polite_Session(
+        session,
+        AIMD_Limiter(max_per_host, delay),
+        metrics=getattr(media, "metrics", None),
+    )
+    try:
+        yield
+    finally:
+        owner.request_session = session
+
+
+def download_all_concurrent(
+    media, retry=False, n_workers=8, max_per_host=4, delay=0.5, prom_file=None
+):
+    """Run media.get_papers_one_day over the missing days with a thread pool
+
+    A day that fails goes to the failure ledger instead of stopping the crawl.
+    The measures of each day go to media.metrics, summed up at the end.
+    """
+    list_date = list_missing_dates(media, retry=retry)
+    if not list_date:
+        return
+    ledger = read_ledger(media)
+    media.metrics.start()
+    bar = pyprind.ProgBar(len(list_date))
+    with polite_session(media, n_workers, max_per_host, delay):
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                executor.submit(media.get_papers_one_day, date=date): date
+                for date in list_date
+            }
+            try:
+                for future in as_completed(futures):
+                    date_str = futures[future].strftime("%Y-%m-%d")
+                    try:
+                        future.result()
+                        ledger.pop(date_str, None)
+                        media.metrics.done(futures[future])
+                    except Exception as error:
+                        attempts = ledger.get(date_str, {}).get("attempts", 0) + 1
+                        ledger[date_str] = {"error": repr(error), "attempts": attempts}
+                        media.metrics.done(futures[future], error=error)
+                    bar.update()
+            except BaseException:
+                # Days already written stay on disk, the next run resumes from there
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                write_ledger(media, ledger)
+    if ledger:
+        print(f"{len(ledger)} days failed, see {ledger_file(media)}")
+    media.metrics.report(prom_file=prom_file)
+
+
+def get_pages_concurrent(get_papers_one_page, date, n_page, n_workers=4):
+    """Fetch pages 1..n_page of a day in parallel, returned in page order"""
+    list_page = range(1, n_page + 1)
+    if n_workers <= 1 or n_page == 1:
+        return [get_papers_one_page(date=date, page=page) for page in list_page]
+    with ThreadPoolExecutor(max_workers=min(n_workers, n_page)) as executor:
+        # executor.map yields the results in the order of list_page
+        list_df = executor.map(
+            lambda page: get_papers_one_page(date=date, page=page), list_page
+        )
+        return list(list_df)
+
+
+def parse_day(parser, columns, date, list_content):
+    """Frame of a day from its raw pages, indexed (date, rank in the page)"""
+    list_df = []
+    for content in list_content:
+        df = pd.DataFrame(parser(content), columns=columns)
+        list_df.append(pd.concat([df], axis=0, keys=[date]))
+    return pd.concat(list_df)
+
+
+def timed_parse_day(parser, columns, date, list_content):
+    # Run in the worker processes, the parse time goes back with the frame
+    start = time.perf_counter()
+    df = parse_day(parser, columns, date, list_content)
+    return df, time.perf_counter() - start
+
+
+def put_until(queue_out, item, stop):
+    """Wait for room in a bounded queue, unless the pipeline is stopping"""
+    while not stop.is_set():
+        try:
+            queue_out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def get_until(queue_in, stop):
+    """Next item of a queue, or None once the pipeline is stopping"""
+    while not stop.is_set():
+        try:
+            return queue_in.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+
+def download_all_pipeline(
+    media,
+    retry=False,
+    n_fetchers=8,
+    n_parsers=None,
+    queue_size=16,
+    max_per_host=4,
+    delay=0.5,
+    prom_file=None,
+):
+    """Fetch the missing days with threads, parse them in processes, write them
+
+    fetchers (threads) -> queue -> parsers (processes) -> queue -> writer (thread)
+    The queues are bounded and at most 2 * n_parsers days are being parsed, so a
+    slow stage makes the stages before it wait instead of piling pages up.
+    """
+    list_date = list_missing_dates(media, retry=retry)
+    if not list_date:
+        return
+    n_parsers = n_parsers or os.cpu_count()
+    ledger = read_ledger(media)
+    media.metrics.start()
+    bar = pyprind.ProgBar(len(list_date))
+    todo = queue.Queue()
+    for date in list_date:
+        todo.put(date)
+    fetched = queue.Queue(maxsize=queue_size)
+    parsed = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    # Error that stopped the writer, raised again by the main thread
+    writer_errors = []
+
+    def fetch():
+        while not stop.is_set():
+            try:
+                date = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                item = (date, media.fetch_one_day(date=date), None)
+            except Exception as error:
+                item = (date, None, error)
+            put_until(fetched, item, stop)
+
+    def write():
+        try:
+            write_all()
+        except BaseException as error:
+            writer_errors.append(error)
+            stop.set()
+
+    def write_all():
+        for i in range(len(list_date)):
+            item = get_until(parsed, stop)
+            if item is None:
+                return
+            date, df, error = item
+            if error is None:
+                try:
+                    with media.metrics.timer(date, "write"):
+                        save_shard(df, media.path, date, media.storage)
+                    media.metrics.add(date, rows=df.shape[0])
+                except Exception as write_error:
+                    error = write_error
+            date_str = date.strftime("%Y-%m-%d")
+            if error is None:
+                ledger.pop(date_str, None)
+            else:
+                attempts = ledger.get(date_str, {}).get("attempts", 0) + 1
+                ledger[date_str] = {"error": repr(error), "attempts": attempts}
+            media.metrics.done(date, error=error)
+            bar.update()
+
+    def to_writer(date, future):
+        try:
+            df, seconds = future.result()
+            media.metrics.add(date, parse=seconds)
+            put_until(parsed, (date, df, None), stop)
+        except Exception as error:
+            put_until(parsed, (date, None, error), stop)
+
+    writer = threading.Thread(target=write)
+    with polite_session(media, n_fetchers, max_per_host, delay):
+        with ProcessPoolExecutor(max_workers=n_parsers) as executor:
+            fetchers = [threading.Thread(target=fetch) for i in range(n_fetchers)]
+            for thread in fetchers + [writer]:
+                thread.start()
+            in_flight = deque()
+            try:
+                for i in range(len(list_date)):
+                    item = get_until(fetched, stop)
+                    if item is None:
+                        break
+                    date, list_content, error = item
+                    if error is not None:
+                        put_until(parsed, (date, None, error), stop)
+                        continue
+                    if len(in_flight) >= 2 * n_parsers:
+                        to_writer(*in_flight.popleft())
+                    future = executor.submit(
+                        timed_parse_day, media.parser, media.columns, date, list_content
+                    )
+                    in_flight.append((date, future))
+                if not stop.is_set():
+                    while in_flight:
+                        to_writer(*in_flight.popleft())
+                    writer.join()
+                if writer_errors:
+                    raise writer_errors[0]
+            except BaseException:
+                # Days already written stay on disk, the next run resumes from there
+                stop.set()
+                for date, future in in_flight:
+                    future.cancel()
+                raise
+            finally:
+                stop.set()
+                for thread in fetchers + [writer]:
+                    thread.join()
+                write_ledger(media, ledger)
+    if ledger:
+        print(f"{len(ledger)} days failed, see {ledger_file(media)}")
+    media.metrics.report(prom_file=prom_file)
@@ -0,0 +1,193 @@
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from functions.corpus import url_full
+from functions.index import tokenize
+from functions.storage import (
+    diff_manifest,
+    list_shards,
+    read_manifest,
+    read_shard,
+    write_manifest,
+)
+
+# Largest prime below 2**32: the hashes (a * x + b) % PRIME fit in uint32
+PRIME = 4294967291
+SEED = 2020
+
+
+def shingles(text):
+    """Pairs of consecutive words, the word itself for one word titles"""
+    words = tokenize(text)
+    if len(words) < 2:
+        return words
+    return [f"{word1} {word2}" for word1, word2 in zip(words, words[1:])]
+
+
+def minhash(texts, num_perm=64, chunk_size=10_000):
+    """MinHash signatures (n_texts, num_perm) of the shingles of the texts
+
+    Texts without any word keep a signature of PRIME everywhere.
+    """
+    rng = np.random.default_rng(SEED)
+    a = rng.integers(1, PRIME, size=num_perm, dtype=np.uint64)[:, None]
+    b = rng.integers(0, PRIME, size=num_perm, dtype=np.uint64)[:, None]
+    signatures = np.full((len(texts), num_perm), PRIME, dtype=np.uint64)
+    for start in range(0, len(texts), chunk_size):
+        list_hash, list_doc = [], []
+        for doc, text in enumerate(texts[start : start + chunk_size], start=start):
+            # crc32 is stable between runs, unlike hash()
+            hashes = [zlib.crc32(shingle.encode()) for shingle in shingles(text)]
+            list_hash += hashes
+            list_doc += [doc] * len(hashes)
+        if not list_hash:
+            continue
+        x = np.array(list_hash, dtype=np.uint64)
+        docs = np.array(list_doc)
+        # a, b, x < 2**32 so a * x + b cannot overflow uint64
+        values = (a * x + b) % PRIME
+        starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+        signatures[docs[starts]] = np.minimum.reduceat(values, starts, axis=1).T
+    return signatures.astype(np.uint32)
+
+
+def connected_components(n, left, right):
+    """Smallest node id of the component of each node, edges left[i]-right[i]"""
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, left, low)
+        np.minimum.at(new_labels, right, low)
+        # Pointer jumping until every node points to a root
+        while True:
+            jumped = new_labels[new_labels]
+            if np.array_equal(jumped, new_labels):
+                break
+            new_labels = jumped
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def lsh_clusters(signatures, bands=16, threshold=0.5, valid=None):
+    """Groups of near-duplicates, without comparing every pair
+
+    Signatures falling in the same bucket of a band are compared to the first
+    signature of the bucket only, and kept if they agree on threshold of the
+    permutations (estimated Jaccard similarity of the shingles).
+    """
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    if valid is None:
+        valid = np.ones(n, dtype=bool)
+    doc_ids = np.flatnonzero(valid)
+    list_left, list_right = [], []
+    for band in range(bands):
+        values = signatures[doc_ids, band * rows : (band + 1) * rows]
+        order = np.lexsort(values.T[::-1])
+        sorted_values = values[order]
+        new_bucket = np.r_[True, np.any(sorted_values[1:] != sorted_values[:-1], 1)]
+        # Position of the first signature of the bucket of each position
+        starts = np.where(new_bucket, np.arange(len(order)), 0)
+        first = order[np.maximum.accumulate(starts)]
+        member = ~new_bucket
+        left, right = doc_ids[order[member]], doc_ids[first[member]]
+        agreement = (signatures[left] == signatures[right]).mean(axis=1)
+        list_left.append(left[agreement >= threshold])
+        list_right.append(right[agreement >= threshold])
+    left, right = np.concatenate(list_left), np.concatenate(list_right)
+    return connected_components(n, left, right)
+
+
+class Headline_Dedup:
+    """MinHash signatures of the titles of each outlet on disk, clustered by LSH
+
+    Only the days whose shard is new or changed are hashed again by update.
+    """
+
+    def __init__(
+        self, root="data/dedup", columns=("title",), num_perm=64, bands=16
+    ) -> None:
+        self.root = root
+        # Descriptions only exist for some outlets, titles alone match across all
+        self.columns = list(columns)
+        self.num_perm = num_perm
+        self.bands = bands
+
+    def signature_file(self, outlet):
+        return f"{self.root}/outlet={outlet}/signatures.parquet"
+
+    def update(self, path, outlet):
+        manifest_file = f"{self.root}/outlet={outlet}/_manifest.json"
+        shards = list_shards(path)
+        list_changed, manifest = diff_manifest(shards, read_manifest(manifest_file))
+        if not list_changed:
+            return list_changed
+        file = self.signature_file(outlet)
+        list_df = []
+        if os.path.isfile(file):
+            df = pd.read_parquet(file)
+            list_df.append(df[~df.date.dt.strftime("%Y-%m-%d").isin(list_changed)])
+        list_day = [
+            read_shard(shards[date_str])
+            for date_str in list_changed
+            if date_str in shards
+        ]
+        if list_day:
+            DF = pd.concat(list_day)
+            texts = DF[[c for c in self.columns if c in DF.columns]].fillna("")
+            texts = texts.astype(str).agg(" ".join, axis=1).tolist()
+            signatures = minhash(texts, num_perm=self.num_perm)
+            df = pd.DataFrame(
+                {
+                    "date": DF.index.get_level_values(0),
+                    "rank": DF.index.get_level_values(1),
+                    "url": DF.url.to_numpy(),
+                    "title": DF.title.to_numpy(),
+                    "valid": [bool(tokenize(text)) for text in texts],
+                    "signature": [row.tobytes() for row in signatures],
+                }
+            )
+            list_df.append(df)
+        os.makedirs(f"{self.root}/outlet={outlet}", exist_ok=True)
+        pd.concat(list_df, ignore_index=True).to_parquet(file, index=False)
+        write_manifest(manifest, manifest_file)
+        return list_changed
+
+    def clusters(self, outlets=None, threshold=0.5):
+        """One row per headline with its cluster, the cluster size and whether an
+        earlier headline (by date, then outlet) of the cluster exists
+        """
+        list_df = []
+        for folder in sorted(os.listdir(self.root)):
+            outlet = folder.split("=")[-1]
+            if outlets is not None and outlet not in outlets:
+                continue
+            df = pd.read_parquet(self.signature_file(outlet))
+            df.insert(0, "outlet", outlet)
+            list_df.append(df)
+        df = pd.concat(list_df, ignore_index=True)
+        signatures = np.frombuffer(b"".join(df.pop("signature")), dtype=np.uint32)
+        signatures = signatures.reshape(-1, self.num_perm)
+        df["cluster"] = lsh_clusters(
+            signatures, self.bands, threshold, valid=df.valid.to_numpy()
+        )
+        df["size"] = df.groupby("cluster").cluster.transform("size")
+        df = df.sort_values(["date", "outlet", "rank"], kind="stable")
+        df["duplicate"] = df.duplicated("cluster")
+        return df.sort_index()
+
+
+def mark_duplicates(DF, df_clusters):
+    """cluster and duplicate columns on a frame of corpus.load_corpus"""
+    keys = pd.MultiIndex.from_arrays(
+        [DF.outlet.astype(str), DF.index, url_full(DF).astype(object)]
+    )
+    df_clusters = df_clusters.set_index(["outlet", "date", "url"])
+    df_clusters = df_clusters[~df_clusters.index.duplicated()]
+    DF = DF.copy()
+    DF["cluster"] = df_clusters.cluster.reindex(keys).to_numpy()
+    DF["duplicate"] = df_clusters.duplicate.reindex(keys).fillna(False).to_numpy()
+    return DF
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+import pandas as pd
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+KEPT_HEADERS = ["content-type", "etag", "last-modified"]
+# Date formats of the archive urls of the outlets
+DATE_FORMATS = ["%d-%B-%Y", "%d-%m-%Y", "%Y-%m-%d", "%Y/%m/%d"]
+
+
+def is_recent_archive(url, days=2):
+    """Archive pages of the last days can still change"""
+    today = pd.Timestamp.today().normalize()
+    for n in range(days + 1):
+        date = today - pd.Timedelta(days=n)
+        for date_format in DATE_FORMATS:
+            date_string = date.strftime(date_format).lower()
+            if date_string.replace("é", "e").replace("û", "u") in url.lower():
+                return True
+    return False
+
+
+def make_response(url, status_code, content, headers):
+    r = requests.models.Response()
+    r.url = url
+    r.status_code = status_code
+    r._content = content
+    r.headers = CaseInsensitiveDict(headers)
+    r.encoding = get_encoding_from_headers(r.headers)
+    # The body is already read, iter_content can serve it
+    r._content_consumed = True
+    return r
+
+
+def cached_response(url, content, headers):
+    r = make_response(url, 200, content, headers)
+    # Counted as a cache hit by Crawl_Metrics, not as a page fetched
+    r.from_cache = True
+    return r
+
+
+def write_file(file, data):
+    """Write through a temporary file so that readers never see half a file"""
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    tmp_file = f"{file}.{threading.get_ident()}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(data)
+    os.replace(tmp_file, file)
+
+
+class Cached_Session:
+    """Serve get from a compressed, content-addressed cache under data/
+
+    Pages are read from the cache without any request, except the pages for
+    which mutable(url) is true: once their entry is older than max_age seconds
+    they are revalidated with If-None-Match/If-Modified-Since.
+    """
+
+    def __init__(
+        self,
+        request_session,
+        root="data/http_cache",
+        max_bytes=2 * 1024**3,
+        mutable=None,
+        max_age=0,
+    ) -> None:
+        self.request_session = request_session
+        self.root = root
+        self.max_bytes = max_bytes
+        self.mutable = mutable
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.n_bytes = sum(size for file, size, mtime in self.list_blobs())
+
+    def entry_file(self, url):
+        key = hashlib.sha1(url.encode()).hexdigest()
+        return f"{self.root}/urls/{key[:2]}/{key}.json"
+
+    def blob_file(self, digest):
+        return f"{self.root}/blobs/{digest[:2]}/{digest}.z"
+
+    def list_blobs(self):
+        """(file, size, mtime) of each blob
+
+        Another session (outlet, cron run) can evict from the same folder at the
+        same time, the blobs removed meanwhile are skipped.
+        """
+        list_blob = []
+        if os.path.isdir(f"{self.root}/blobs"):
+            for folder in os.scandir(f"{self.root}/blobs"):
+                for file in os.scandir(folder.path):
+                    if file.name.endswith(".z"):
+                        try:
+                            stat = file.stat()
+                        except FileNotFoundError:
+                            continue
+                        list_blob.append((file.path, stat.st_size, stat.st_mtime))
+        return list_blob
+
+    def read(self, url):
+        """Cached entry and body of a url, None if missing or evicted"""
+        try:
+            with open(self.entry_file(url)) as f:
+                entry = json.load(f)
+            blob_file = self.blob_file(entry["digest"])
+            with open(blob_file, "rb") as f:
+                content = zlib.decompress(f.read())
+            # Eviction drops the least recently used blobs first
+            os.utime(blob_file)
+        except (OSError, ValueError, zlib.error):
+            return None, None
+        return entry, content
+
+    def write(self, url, r):
+        digest = hashlib.sha256(r.content).hexdigest()
+        blob_file = self.blob_file(digest)
+        if not os.path.isfile(blob_file):
+            data = zlib.compress(r.content)
+            write_file(blob_file, data)
+            with self.lock:
+                self.n_bytes += len(data)
+        headers = {k: r.headers[k] for k in KEPT_HEADERS if k in r.headers}
+        entry = {"digest": digest, "headers": headers, "time": time.time()}
+        write_file(self.entry_file(url), json.dumps(entry).encode())
+        if self.n_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used blobs until 90% of max_bytes"""
+        with self.lock:
+            list_blob = sorted(self.list_blobs(), key=lambda blob: blob[2])
+            self.n_bytes = sum(size for file, size, mtime in list_blob)
+            for file, size, mtime in list_blob:
+                if self.n_bytes <= 0.9 * self.max_bytes:
+                    break
+                try:
+                    os.remove(file)
+                except FileNotFoundError:
+                    # Already evicted by another session
+                    pass
+                self.n_bytes -= size
+
+    def get(self, url, **kwargs):
+        entry, content = self.read(url)
+        if entry is not None:
+            stale = time.time() - entry["time"] > self.max_age
+            if self.mutable is None or not self.mutable(url) or not stale:
+                return cached_response(url, content, entry["headers"])
+            headers = dict(kwargs.pop("headers", None) or {})
+            if "etag" in entry["headers"]:
+                headers["If-None-Match"] = entry["headers"]["etag"]
+            if "last-modified" in entry["headers"]:
+                headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+            kwargs["headers"] = headers
+        r = self.request_session.get(url=url, **kwargs)
+        if r.status_code == 304 and entry is not None:
+            entry["time"] = time.time()
+            write_file(self.entry_file(url), json.dumps(entry).encode())
+            return cached_response(url, content, entry["headers"])
+        # A streamed response may be read partially, it is not cached
+        if r.status_code == 200 and not kwargs.get("stream"):
+            self.write(url, r)
+        return r
+
+    def __getattr__(self, name):
+        return getattr(self.request_session, name)
+
@@ -0,0 +1,161 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from functions.storage import (
+    diff_manifest,
+    list_shards,
+    read_manifest,
+    read_shard,
+    write_manifest,
+)
+
+TOKEN = re.compile(r"\w+")
+# Postings are matched on doc * MAX_POSITION + position
+MAX_POSITION = 1 << 16
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def index_days(DF):
+    """Document table and postings of a (date, rank) indexed frame of titles"""
+    titles = DF.title.fillna("").tolist()
+    list_token, list_doc, list_position = [], [], []
+    for doc, title in enumerate(titles):
+        tokens = tokenize(title)
+        list_token += tokens
+        list_doc += [doc] * len(tokens)
+        list_position += range(len(tokens))
+    df_docs = pd.DataFrame(
+        {
+            "date": DF.index.get_level_values(0),
+            "rank": DF.index.get_level_values(1),
+            "n_chars": [len(title) for title in titles],
+        }
+    )
+    df_postings = pd.DataFrame(
+        {"token": list_token, "doc": list_doc, "position": list_position}
+    )
+    return df_docs, df_postings
+
+
+class Headline_Index:
+    """Inverted index token -> (outlet, date, doc id) of the titles, on disk"""
+
+    def __init__(self, root="data/index") -> None:
+        self.root = root
+        self.docs = None
+
+    def segment(self, outlet, month):
+        return f"{self.root}/outlet={outlet}/month={month}"
+
+    def read_segment(self, folder):
+        df_docs = pd.read_parquet(f"{folder}/docs.parquet")
+        df_postings = pd.read_parquet(f"{folder}/postings.parquet")
+        return df_docs, df_postings
+
+    def update(self, path, outlet):
+        """Index the day shards of a folder that are new or changed"""
+        manifest_file = f"{self.root}/outlet={outlet}/_manifest.json"
+        shards = list_shards(path)
+        list_changed, manifest = diff_manifest(shards, read_manifest(manifest_file))
+        for month in sorted(set(date_str[:7] for date_str in list_changed)):
+            folder = self.segment(outlet, month)
+            list_month = [d for d in list_changed if d[:7] == month]
+            list_docs, list_postings = [], []
+            n_doc = 0
+            if os.path.isdir(folder):
+                # Keep the documents of the other days, renumbered
+                df_docs, df_postings = self.read_segment(folder)
+                dates = df_docs.date.dt.strftime("%Y-%m-%d")
+                keep = ~dates.isin(list_month).to_numpy()
+                new_doc = np.cumsum(keep) - 1
+                df_postings = df_postings[keep[df_postings.doc]].copy()
+                df_postings["doc"] = new_doc[df_postings.doc]
+                list_docs.append(df_docs[keep])
+                list_postings.append(df_postings)
+                n_doc = keep.sum()
+            for date_str in list_month:
+                if date_str in shards:
+                    df_docs, df_postings = index_days(read_shard(shards[date_str]))
+                    df_postings["doc"] += n_doc
+                    n_doc += df_docs.shape[0]
+                    list_docs.append(df_docs)
+                    list_postings.append(df_postings)
+            if not list_docs:
+                continue
+            os.makedirs(folder, exist_ok=True)
+            pd.concat(list_docs).to_parquet(f"{folder}/docs.parquet", index=False)
+            pd.concat(list_postings).to_parquet(
+                f"{folder}/postings.parquet", index=False
+            )
+        os.makedirs(f"{self.root}/outlet={outlet}", exist_ok=True)
+        write_manifest(manifest, manifest_file)
+        self.docs = None
+
+    def load(self):
+        """Read every segment in memory, postings sorted by token"""
+        list_docs, list_postings = [], []
+        n_doc = 0
+        for outlet_folder in sorted(os.listdir(self.root)):
+            outlet = outlet_folder.split("=")[-1]
+            for month_folder in sorted(os.listdir(f"{self.root}/{outlet_folder}")):
+                if not month_folder.startswith("month="):
+                    continue
+                folder = f"{self.root}/{outlet_folder}/{month_folder}"
+                df_docs, df_postings = self.read_segment(folder)
+                df_docs["outlet"] = outlet
+                df_postings["doc"] += n_doc
+                n_doc += df_docs.shape[0]
+                list_docs.append(df_docs)
+                list_postings.append(df_postings)
+        self.docs = pd.concat(list_docs, ignore_index=True)
+        self.docs["outlet"] = self.docs.outlet.astype("category")
+        df_postings = pd.concat(list_postings, ignore_index=True)
+        df_postings = df_postings.sort_values("token", kind="stable")
+        self.tokens, self.token_starts = np.unique(
+            df_postings.token.to_numpy(dtype=object), return_index=True
+        )
+        self.token_ends = np.append(self.token_starts[1:], df_postings.shape[0])
+        self.postings_doc = df_postings.doc.to_numpy()
+        self.postings_position = df_postings.position.to_numpy()
+
+    def postings(self, token):
+        """Doc ids and positions of a token"""
+        i = np.searchsorted(self.tokens, token)
+        if i == len(self.tokens) or self.tokens[i] != token:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        start, end = self.token_starts[i], self.token_ends[i]
+        return self.postings_doc[start:end], self.postings_position[start:end]
+
+    def count(self, phrase):
+        """Occurrences of a word or phrase in each document"""
+        if self.docs is None:
+            self.load()
+        tokens = tokenize(phrase)
+        if not tokens:
+            return np.zeros(self.docs.shape[0], dtype=int)
+        docs, positions = self.postings(tokens[0])
+        keys = docs * MAX_POSITION + positions
+        # A phrase matches where token k sits k positions after the first one
+        for k, token in enumerate(tokens[1:], start=1):
+            next_docs, next_positions = self.postings(token)
+            keys = keys[np.isin(keys, next_docs * MAX_POSITION + next_positions - k)]
+        return np.bincount(keys // MAX_POSITION, minlength=self.docs.shape[0])
+
+    def get_counts(self, keywords, normalized=True, outlets=None):
+        """Same frame as word_trends.get_counts, counting whole tokens/phrases"""
+        if self.docs is None:
+            self.load()
+        selected = np.ones(self.docs.shape[0], dtype=bool)
+        if outlets is not None:
+            selected = self.docs.outlet.isin(outlets).to_numpy()
+        df_trend = pd.DataFrame(index=pd.DatetimeIndex(self.docs.date[selected]))
+        for keyword in keywords:
+            count = self.count(keyword)[selected]
+            if normalized:
+                count = count / self.docs.n_chars.to_numpy()[selected]
+            df_trend[keyword] = count
+        return df_trend
@@ -2,23 +2,64 @@ import os
 import pandas as pd
 import requests
 import time
-from bs4 import BeautifulSoup
-import pyprind
-from requests_tor import RequestsTor
+from functions.content import load_content
+from functions.covid import COVID_KEYWORDS, classify_titles
+from functions.http_cache import Cached_Session, is_recent_archive
+from functions.metrics import Crawl_Metrics
+from functions.crawl import (
+    download_all_concurrent,
+    download_all_pipeline,
+    get_pages_concurrent,
+    parse_day,
+)
+from functions.parsers import (
+    parse_france_info,
+    parse_le_parisien,
+    parse_le_monde,
+    parse_lexpress,
+    parse_liberation,
+    parse_n_page_le_monde,
+    parse_n_page_lexpress,
+)
+from functions.storage import load_dataset, save_shard
+from functions.tor_pool import Tor_Pool
 
 
 class France_Info:
+    # Parser of the archive pages, run in worker processes by the pipeline
+    parser = staticmethod(parse_france_info)
+    columns = ["title", "url"]
 
     def __init__(
-        self, start_date="2020-02-01", end_date="2023-12-31", folder_name="france_info"
+        self,
+        start_date="2020-02-01",
+        end_date="2023-12-31",
+        folder_name="france_info",
+        storage="parquet",
+        cache=True,
+        cache_max_bytes=2 * 1024**3,
     ) -> None:
         # Create a data folder
         self.path = f"data/{folder_name}"
         if not os.path.isdir(self.path):
             os.mkdir(self.path)
         # List of days to itervate over
-        self.list_date = pd.date_range(start="2020-02-01", end="2023-12-31", freq="D")
+        self.list_date = pd.date_range(start=start_date, end=end_date, freq="D")
+        self.outlet = folder_name
+        # Format of the day shards: "parquet" or "pickle"
+        self.storage = storage
+        # Time, bytes and rows of each day crawled, logged by download_all
+        self.metrics = Crawl_Metrics(
+            self.outlet, log_file=f"{self.path}/crawl_metrics.jsonl"
+        )
         self.request_session = requests.Session()
+        # Raw responses are kept under data/http_cache, LRU evicted past max bytes
+        if cache:
+            self.request_session = Cached_Session(
+                self.request_session,
+                max_bytes=cache_max_bytes,
+                mutable=is_recent_archive,
+            )
 
     def get_url(self, date):
         url_base = "https://www.francetvinfo.fr/archives/"
@@ -26,111 +67,118 @@ class France_Info:
         url_full = f"{url_base}{date.year}/{date_string}.html"
         return url_full
 
-    def get_papers_one_day(self, date):
+    def fetch_one_day(self, date):
+        """Raw archive pages of a day"""
         url_full = self.get_url(date=date)
         # r = requests.get(url=url_full)
-        r = self.request_session.get(url=url_full)
+        r = self.metrics.get(self.request_session, date, url_full)
         if r.status_code != 200:
             print(url_full)
             raise Warning(f"Status code incorect: {r.status_code}")
-        else:
-            # print(date)
-            soup = BeautifulSoup(r.content, features="lxml")
-            list_article = soup.find_all("article")
-            list_info = []
-            for i, article in enumerate(list_article):
-                url_article = article.a.get("href")
-                title_article = article.get_text().replace("\n", "").strip()
-                list_info.append([title_article, url_article])
-            df = pd.DataFrame(list_info, columns=["title", "url"])
-            df = pd.concat([df], axis=0, keys=[date])
-            date_str = date.strftime("%Y-%m-%d")
-            df.to_pickle(f"{self.path}/df_{date_str}.pkl")
-            return df
-
-    def download_all(self, retry=False):
-        bar = pyprind.ProgBar(len(self.list_date))
-        for date in self.list_date:
-            date_str = date.strftime("%Y-%m-%d")
-            if not os.path.isfile(f"{self.path}/df_{date_str}.pkl"):
-                df = self.get_papers_one_day(date=date)
-            bar.update()
-
-    def load_data(self):
-        final_file = f"{self.path}/DF.pkl"
-        if not os.path.isfile(final_file):
-            list_file = os.listdir(self.path)
-            list_file = [file for file in list_file if file.startswith("df_")]
-            list_df = []
-            for file in list_file:
-                df = pd.read_pickle(self.path + "/" + file)
-                list_df.append(df)
-            DF = pd.concat(list_df)
-            DF.to_pickle(final_file)
-        DF = pd.read_pickle(final_file)
+        return [r.content]
+
+    def get_papers_one_day(self, date):
+        list_content = self.fetch_one_day(date=date)
+        with self.metrics.timer(date, "parse"):
+            df = parse_day(self.parser, self.columns, date, list_content)
+        with self.metrics.timer(date, "write"):
+            save_shard(df, self.path, date, self.storage)
+        self.metrics.add(date, rows=df.shape[0])
+        return df
+
+    def download_all(
+        self,
+        retry=False,
+        n_workers=1,
+        max_per_host=4,
+        delay=0.5,
+        prom_file=None,
+        n_parsers=0,
+    ):
+        # With n_parsers, the pages are parsed in that many processes
+        if n_parsers:
+            download_all_pipeline(
+                self,
+                retry=retry,
+                n_fetchers=n_workers,
+                n_parsers=n_parsers,
+                max_per_host=max_per_host,
+                delay=delay,
+                prom_file=prom_file,
+            )
+            return
+        download_all_concurrent(
+            self,
+            retry=retry,
+            n_workers=n_workers,
+            max_per_host=max_per_host,
+            delay=delay,
+            prom_file=prom_file,
+        )
+
+    def load_data(self, columns=None, start_date=None, end_date=None):
+        DF = load_dataset(
+            self.path,
+            self.outlet,
+            storage=self.storage,
+            columns=columns,
+            start_date=start_date,
+            end_date=end_date,
+        )
         self.dataframe = DF
         return DF
 
-    def is_COVID_related(self):
-        def check_if_COVID_related(row):
-            """Test if some COVID related keywords are mentioned"""
-            title = row.lower()
-            COVID_keywords = [
-                "covid",
-                "coronavirus",
-                "2019-nCoV",
-                "Covid-19",
-            ]  # "épidémie", "pandémie",
-            COVID_keywords = set([kw.lower() for kw in COVID_keywords])
-            title_words = set(title.split())
-            if COVID_keywords.intersection(title_words):
-                COVID_related = True
-            else:
-                COVID_related = False
-            return COVID_related
-
-        self.dataframe["COVID_related"] = self.dataframe.title.apply(
-            check_if_COVID_related
+    def is_COVID_related(self, keywords=COVID_KEYWORDS, hits=False):
+        df_covid = classify_titles(self.dataframe.title, keywords=keywords, hits=hits)
+        for column in df_covid.columns:
+            self.dataframe[column] = df_covid[column]
+
+    def load_content_of_COVID_related_papers(self, n_workers=8, batch_size=500):
+        df = load_content(
+            self,
+            url_base="https://www.francetvinfo.fr/",
+            n_workers=n_workers,
+            batch_size=batch_size,
         )
-
-    def load_content_of_COVID_related_papers(self):
-        file = f"{self.path}/DF_with_content.pkl"
-        if not os.path.isfile(file):
-            df = self.dataframe
-            df = df[df.COVID_related]
-
-            def get_twitter_description(url_article, bar):
-                """Download the "chapeau" of the article"""
-                url_full = "https://www.francetvinfo.fr/" + url_article
-                r = self.request_session.get(url=url_full)
-                if r.status_code != 200:
-                    raise Warning(f"Status code incorect: {r.status_code}")
-                soup = BeautifulSoup(r.content, features="lxml")
-                description = soup.find(attrs={"property": "twitter:description"})
-                bar.update()
-                return description.attrs["content"]
-
-            bar = pyprind.ProgBar(df.shape[0])
-            df["content"] = df.url.apply(lambda x: get_twitter_description(x, bar=bar))
-            df.to_pickle(file)
-
-        df = pd.read_pickle(file)
         self.dataframe_COVID_related = df
         return df
 
 
 class Le_Parisien:
+    # Parser of the archive pages, run in worker processes by the pipeline
+    parser = staticmethod(parse_le_parisien)
+    columns = ["title", "url"]
 
     def __init__(
-        self, start_date="2020-02-01", end_date="2023-12-31", folder_name="le_parisien"
+        self,
+        start_date="2020-02-01",
+        end_date="2023-12-31",
+        folder_name="le_parisien",
+        storage="parquet",
+        cache=True,
+        cache_max_bytes=2 * 1024**3,
     ) -> None:
         # Create a data folder
         self.path = f"data/{folder_name}"
         if not os.path.isdir(self.path):
             os.mkdir(self.path)
         # List of days to itervate over
-        self.list_date = pd.date_range(start="2020-02-01", end="2023-12-31", freq="D")
+        self.list_date = pd.date_range(start=start_date, end=end_date, freq="D")
+        self.outlet = folder_name
+        # Format of the day shards: "parquet" or "pickle"
+        self.storage = storage
+        # Time, bytes and rows of each day crawled, logged by download_all
+        self.metrics = Crawl_Metrics(
+            self.outlet, log_file=f"{self.path}/crawl_metrics.jsonl"
+        )
         self.request_session = requests.Session()
+        # Raw responses are kept under data/http_cache, LRU evicted past max bytes
+        if cache:
+            self.request_session = Cached_Session(
+                self.request_session,
+                max_bytes=cache_max_bytes,
+                mutable=is_recent_archive,
+            )
 
     def get_url(self, date):
         url_base = "https://www.leparisien.fr/archives/"
@@ -138,95 +186,119 @@ class Le_Parisien:
         url_full = f"{url_base}/{date.year}/{date_string}"
         return url_full
 
-    def get_papers_one_day(self, date):
+    def fetch_one_day(self, date):
+        """Raw archive pages of a day"""
         url_full = self.get_url(date=date)
         # r = requests.get(url=url_full)
-        r = self.request_session.get(url=url_full)
+        r = self.metrics.get(self.request_session, date, url_full)
         if r.status_code != 200:
             print(url_full)
             raise Warning(f"Status code incorect: {r.status_code}")
-        else:
-            # print(date)
-            soup = BeautifulSoup(r.content, features="lxml")
-            list_article = soup.find_all(
-                "div",
-                attrs={"class": "story-preview story-preview--oneline flex-feed-unit"},
+        return [r.content]
+
+    def get_papers_one_day(self, date):
+        list_content = self.fetch_one_day(date=date)
+        with self.metrics.timer(date, "parse"):
+            df = parse_day(self.parser, self.columns, date, list_content)
+        with self.metrics.timer(date, "write"):
+            save_shard(df, self.path, date, self.storage)
+        self.metrics.add(date, rows=df.shape[0])
+        return df
+
+    def download_all(
+        self,
+        retry=False,
+        n_workers=1,
+        max_per_host=4,
+        delay=0.5,
+        prom_file=None,
+        n_parsers=0,
+    ):
+        # With n_parsers, the pages are parsed in that many processes
+        if n_parsers:
+            download_all_pipeline(
+                self,
+                retry=retry,
+                n_fetchers=n_workers,
+                n_parsers=n_parsers,
+                max_per_host=max_per_host,
+                delay=delay,
+                prom_file=prom_file,
             )
-            list_info = []
-            for i, article in enumerate(list_article):
-                url_article = article.a.get("href").replace("//", "https://")
-                title_article = article.find(attrs={"class": "story-headline"}).text
-                list_info.append([title_article, url_article])
-            df = pd.DataFrame(list_info, columns=["title", "url"])
-            df = pd.concat([df], axis=0, keys=[date])
-            date_str = date.strftime("%Y-%m-%d")
-            df.to_pickle(f"{self.path}/df_{date_str}.pkl")
-            return df
-
-    def download_all(self, retry=False):
-        bar = pyprind.ProgBar(len(self.list_date))
-        for date in self.list_date:
-            date_str = date.strftime("%Y-%m-%d")
-            if not os.path.isfile(f"{self.path}/df_{date_str}.pkl"):
-                df = self.get_papers_one_day(date=date)
-            bar.update()
-
-    def load_data(self):
-        final_file = f"{self.path}/DF.pkl"
-        if not os.path.isfile(final_file):
-            list_file = os.listdir(self.path)
-            list_file = [file for file in list_file if file.startswith("df_")]
-            list_df = []
-            for file in list_file:
-                df = pd.read_pickle(self.path + "/" + file)
-                list_df.append(df)
-            DF = pd.concat(list_df)
-            DF.to_pickle(final_file)
-        DF = pd.read_pickle(final_file)
+            return
+        download_all_concurrent(
+            self,
+            retry=retry,
+            n_workers=n_workers,
+            max_per_host=max_per_host,
+            delay=delay,
+            prom_file=prom_file,
+        )
+
+    def load_data(self, columns=None, start_date=None, end_date=None):
+        DF = load_dataset(
+            self.path,
+            self.outlet,
+            storage=self.storage,
+            columns=columns,
+            start_date=start_date,
+            end_date=end_date,
+        )
         self.dataframe = DF
         return DF
 
-    def is_COVID_related(self):
-        def check_if_COVID_related(row):
-            """Test if some COVID related keywords are mentioned"""
-            title = row.lower()
-            COVID_keywords = [
-                "covid",
-                "coronavirus",
-                "2019-nCoV",
-                "Covid-19",
-            ]  # "épidémie", "pandémie",
-            COVID_keywords = set([kw.lower() for kw in COVID_keywords])
-            title_words = set(title.split())
-            if COVID_keywords.intersection(title_words):
-                COVID_related = True
-            else:
-                COVID_related = False
-            return COVID_related
-
-        self.dataframe["COVID_related"] = self.dataframe.title.apply(
-            check_if_COVID_related
-        )
+    def is_COVID_related(self, keywords=COVID_KEYWORDS, hits=False):
+        df_covid = classify_titles(self.dataframe.title, keywords=keywords, hits=hits)
+        for column in df_covid.columns:
+            self.dataframe[column] = df_covid[column]
+
+    def load_content_of_COVID_related_papers(self, n_workers=8, batch_size=500):
+        df = load_content(self, n_workers=n_workers, batch_size=batch_size)
+        self.dataframe_COVID_related = df
+        return df
 
 
 class Le_Monde:
+    # Parser of the archive pages, run in worker processes by the pipeline
+    parser = staticmethod(parse_le_monde)
+    columns = ["title", "url", "description"]
 
     def __init__(
-        self, start_date="2020-02-01", end_date="2023-12-31", folder_name="le_monde"
+        self,
+        start_date="2020-02-01",
+        end_date="2023-12-31",
+        folder_name="le_monde",
+        storage="parquet",
+        cache=True,
+        cache_max_bytes=2 * 1024**3,
+        tor_ports=(9050,),
+        circuits_per_port=4,
     ) -> None:
         # Create a data folder
         self.path = f"data/{folder_name}"
         if not os.path.isdir(self.path):
             os.mkdir(self.path)
         # List of days to itervate over
-        self.list_date = pd.date_range(start="2020-02-01", end="2023-12-31", freq="D")
+        self.list_date = pd.date_range(start=start_date, end=end_date, freq="D")
+        self.outlet = folder_name
+        # Format of the day shards: "parquet" or "pickle"
+        self.storage = storage
+        # Time, bytes and rows of each day crawled, logged by download_all
+        self.metrics = Crawl_Metrics(
+            self.outlet, log_file=f"{self.path}/crawl_metrics.jsonl"
+        )
         # self.request_session = requests.Session()
-        self.request_session = RequestsTor()
-        self.request_session.proxies = {
-            "http": "socks5h://localhost:9050",
-            "https": "socks5h://localhost:9050",
-        }
-        # RequestsTor(tor_ports=(9000, 9001, 9002, 9003, 9004), autochange_id=5)
+        # Le Monde is crawled through Tor, spread over several circuits
+        self.request_session = Tor_Pool(
+            ports=tor_ports, circuits_per_port=circuits_per_port
+        )
+        # Raw responses are kept under data/http_cache, LRU evicted past max bytes
+        if cache:
+            self.request_session = Cached_Session(
+                self.request_session,
+                max_bytes=cache_max_bytes,
+                mutable=is_recent_archive,
+            )
 
     def get_url(self, date, page):
         url_base = "https://www.lemonde.fr/archives-du-monde"
@@ -234,113 +306,138 @@ class Le_Monde:
         url_full = f"{url_base}/{date_string}/{page}/"
         return url_full
 
-    def get_papers_one_page(self, date, page):
+    def fetch_one_page(self, date, page):
         url_full = self.get_url(date=date, page=page)
         # r = requests.get(url=url_full)
-        r = self.request_session.get(url=url_full)
+        r = self.metrics.get(self.request_session, date, url_full)
         if r.status_code != 200:
             print(url_full)
             raise Warning(f"Status code incorect: {r.status_code}")
-        else:
-            # print(date)
-            soup = BeautifulSoup(r.content, features="lxml")
-            list_article = list_article = soup.find_all(
-                "a", attrs={"class": "teaser__link"}
-            )
-            list_info = []
-            for i, article in enumerate(list_article):
-                url_article = article.get("href")
-                title_article = str(article.h3.string)
-                description_article = str(article.p.text)
-                list_info.append([title_article, url_article, description_article])
-            df = pd.DataFrame(list_info, columns=["title", "url", "description"])
-            df = pd.concat([df], axis=0, keys=[date])
-            return df
+        return r.content
 
-    def get_papers_one_day(self, date):
+    def get_papers_one_page(self, date, page):
+        content = self.fetch_one_page(date=date, page=page)
+        with self.metrics.timer(date, "parse"):
+            df = parse_day(self.parser, self.columns, date, [content])
+        return df
+
+    def fetch_one_day(self, date, n_workers=4):
+        """Raw archive pages of a day, in page order"""
         # Get the number of page
         ##Procedure go to next date and "click" on previous
         url_full = self.get_url(date=date + pd.Timedelta("1D"), page=1)
         # r = requests.get(url=url_full)
-        r = self.request_session.get(url=url_full)
-        soup = BeautifulSoup(r.content, features="lxml")
-        try:
-            n_page = int(
-                soup.find("link", attrs={"rel": "prev"}).get("href").split("/")[-2]
-            )
-        except:
-            n_page = 1
+        r = self.metrics.get(self.request_session, date, url_full)
+        # An error page has no pagination, the day would be saved with page 1 only
+        if r.status_code != 200:
+            print(url_full)
+            raise Warning(f"Status code incorect: {r.status_code}")
+        with self.metrics.timer(date, "parse"):
+            n_page = parse_n_page_le_monde(r.content)
         # print(n_page)
-        list_df = []
-        for page in range(n_page):
-            page += 1
-            df = self.get_papers_one_page(date=date, page=page)
-            list_df.append(df)
-        df = pd.concat(list_df)
-        date_str = date.strftime("%Y-%m-%d")
-        df.to_pickle(f"{self.path}/df_{date_str}.pkl")
+        return get_pages_concurrent(
+            self.fetch_one_page, date=date, n_page=n_page, n_workers=n_workers
+        )
+
+    def get_papers_one_day(self, date, n_workers=4):
+        list_content = self.fetch_one_day(date=date, n_workers=n_workers)
+        with self.metrics.timer(date, "parse"):
+            df = parse_day(self.parser, self.columns, date, list_content)
+        with self.metrics.timer(date, "write"):
+            save_shard(df, self.path, date, self.storage)
+        self.metrics.add(date, rows=df.shape[0])
         return df
 
-    def download_all(self, retry=False):
-        bar = pyprind.ProgBar(len(self.list_date))
-        for date in self.list_date:
-            date_str = date.strftime("%Y-%m-%d")
-            if not os.path.isfile(f"{self.path}/df_{date_str}.pkl"):
-                df = self.get_papers_one_day(date=date)
-            bar.update()
-
-    def load_data(self):
-        final_file = f"{self.path}/DF.pkl"
-        if not os.path.isfile(final_file):
-            list_file = os.listdir(self.path)
-            list_file = [file for file in list_file if file.startswith("df_")]
-            list_df = []
-            for file in list_file:
-                df = pd.read_pickle(self.path + "/" + file)
-                list_df.append(df)
-            DF = pd.concat(list_df)
-            DF.to_pickle(final_file)
-        DF = pd.read_pickle(final_file)
+    def download_all(
+        self,
+        retry=False,
+        n_workers=1,
+        max_per_host=4,
+        delay=0.5,
+        prom_file=None,
+        n_parsers=0,
+    ):
+        # With n_parsers, the pages are parsed in that many processes
+        if n_parsers:
+            download_all_pipeline(
+                self,
+                retry=retry,
+                n_fetchers=n_workers,
+                n_parsers=n_parsers,
+                max_per_host=max_per_host,
+                delay=delay,
+                prom_file=prom_file,
+            )
+            return
+        download_all_concurrent(
+            self,
+            retry=retry,
+            n_workers=n_workers,
+            max_per_host=max_per_host,
+            delay=delay,
+            prom_file=prom_file,
+        )
+
+    def load_data(self, columns=None, start_date=None, end_date=None):
+        DF = load_dataset(
+            self.path,
+            self.outlet,
+            storage=self.storage,
+            columns=columns,
+            start_date=start_date,
+            end_date=end_date,
+        )
         self.dataframe = DF
         return DF
 
-    def is_COVID_related(self):
-        def check_if_COVID_related(row):
-            """Test if some COVID related keywords are mentioned"""
-            title = row.lower()
-            COVID_keywords = [
-                "covid",
-                "coronavirus",
-                "2019-nCoV",
-                "Covid-19",
-            ]  # "épidémie", "pandémie",
-            COVID_keywords = set([kw.lower() for kw in COVID_keywords])
-            title_words = set(title.split())
-            if COVID_keywords.intersection(title_words):
-                COVID_related = True
-            else:
-                COVID_related = False
-            return COVID_related
-
-        self.dataframe["COVID_related"] = self.dataframe.title.apply(
-            check_if_COVID_related
-        )
+    def is_COVID_related(self, keywords=COVID_KEYWORDS, hits=False):
+        df_covid = classify_titles(self.dataframe.title, keywords=keywords, hits=hits)
+        for column in df_covid.columns:
+            self.dataframe[column] = df_covid[column]
+
+    def load_content_of_COVID_related_papers(self, n_workers=8, batch_size=500):
+        df = load_content(self, n_workers=n_workers, batch_size=batch_size)
+        self.dataframe_COVID_related = df
+        return df
 
 
 class Lexpress:
+    # Parser of the archive pages, run in worker processes by the pipeline
+    parser = staticmethod(parse_lexpress)
+    columns = ["title", "url", "description"]
 
     def __init__(
-        self, start_date="2020-02-01", end_date="2023-12-31", folder_name="lexpress"
+        self,
+        start_date="2020-02-01",
+        end_date="2023-12-31",
+        folder_name="lexpress",
+        storage="parquet",
+        cache=True,
+        cache_max_bytes=2 * 1024**3,
     ) -> None:
         # Create a data folder
         self.path = f"data/{folder_name}"
         if not os.path.isdir(self.path):
             os.mkdir(self.path)
         # List of days to itervate over
-        self.list_date = pd.date_range(start="2020-02-01", end="2023-12-31", freq="D")
+        self.list_date = pd.date_range(start=start_date, end=end_date, freq="D")
+        self.outlet = folder_name
+        # Format of the day shards: "parquet" or "pickle"
+        self.storage = storage
+        # Time, bytes and rows of each day crawled, logged by download_all
+        self.metrics = Crawl_Metrics(
+            self.outlet, log_file=f"{self.path}/crawl_metrics.jsonl"
+        )
         self.request_session = requests.Session()
         # self.request_session= RequestsTor()
         # RequestsTor(tor_ports=(9000, 9001, 9002, 9003, 9004), autochange_id=5)
+        # Raw responses are kept under data/http_cache, LRU evicted past max bytes
+        if cache:
+            self.request_session = Cached_Session(
+                self.request_session,
+                max_bytes=cache_max_bytes,
+                mutable=is_recent_archive,
+            )
 
     def get_url(self, date, page):
         url_base = "https://www.lexpress.fr/archives/"
@@ -348,112 +445,133 @@ class Lexpress:
         url_full = f"{url_base}/{date_string}/{page}/"
         return url_full
 
-    def get_papers_one_page(self, date, page):
+    def fetch_one_page(self, date, page):
         url_full = self.get_url(date=date, page=page)
         # r = requests.get(url=url_full)
-        r = self.request_session.get(url=url_full)
+        r = self.metrics.get(self.request_session, date, url_full)
         if r.status_code != 200:
             print(url_full)
             raise Warning(f"Status code incorect: {r.status_code}")
-        else:
-            # print(date)
-            soup = BeautifulSoup(r.content, features="lxml")
-            list_article = soup.find_all(
-                "div", attrs={"class": "archives-article__text"}
-            )
-            list_info = []
-            for i, article in enumerate(list_article):
-                url_short = str(article.a.get("href"))
-                url_article = f"https://www.lexpress.fr/{url_short}"
-                title_article = str(article.a.text)
-                try:
-                    description_article = str(article.p.text)
-                except:
-                    description_article = ""
-                list_info.append([title_article, url_article, description_article])
-            df = pd.DataFrame(list_info, columns=["title", "url", "description"])
-            df = pd.concat([df], axis=0, keys=[date])
-            return df
+        return r.content
 
-    def get_papers_one_day(self, date):
+    def get_papers_one_page(self, date, page):
+        content = self.fetch_one_page(date=date, page=page)
+        with self.metrics.timer(date, "parse"):
+            df = parse_day(self.parser, self.columns, date, [content])
+        return df
+
+    def fetch_one_day(self, date, n_workers=4):
+        """Raw archive pages of a day, in page order"""
         url_full = self.get_url(date=date, page=1)
-        r = self.request_session.get(url=url_full)
-        soup = BeautifulSoup(r.content, features="lxml")
-        try:
-            n_page = int(
-                soup.find("div", attrs={"class": "paginate paginate_list"}).a.text
-            )
-        except:
-            n_page = 1
+        r = self.metrics.get(self.request_session, date, url_full)
+        # An error page has no pagination, the day would be saved with page 1 only
+        if r.status_code != 200:
+            print(url_full)
+            raise Warning(f"Status code incorect: {r.status_code}")
+        with self.metrics.timer(date, "parse"):
+            n_page = parse_n_page_lexpress(r.content)
         # print(n_page)
-        list_df = []
-        for page in range(n_page):
-            page += 1
-            df = self.get_papers_one_page(date=date, page=page)
-            list_df.append(df)
-        df = pd.concat(list_df)
-        date_str = date.strftime("%Y-%m-%d")
-        df.to_pickle(f"{self.path}/df_{date_str}.pkl")
+        return get_pages_concurrent(
+            self.fetch_one_page, date=date, n_page=n_page, n_workers=n_workers
+        )
+
+    def get_papers_one_day(self, date, n_workers=4):
+        list_content = self.fetch_one_day(date=date, n_workers=n_workers)
+        with self.metrics.timer(date, "parse"):
+            df = parse_day(self.parser, self.columns, date, list_content)
+        with self.metrics.timer(date, "write"):
+            save_shard(df, self.path, date, self.storage)
+        self.metrics.add(date, rows=df.shape[0])
         return df
 
-    def download_all(self, retry=False):
-        bar = pyprind.ProgBar(len(self.list_date))
-        for date in self.list_date:
-            date_str = date.strftime("%Y-%m-%d")
-            if not os.path.isfile(f"{self.path}/df_{date_str}.pkl"):
-                df = self.get_papers_one_day(date=date)
-            bar.update()
-
-    def load_data(self):
-        final_file = f"{self.path}/DF.pkl"
-        if not os.path.isfile(final_file):
-            list_file = os.listdir(self.path)
-            list_file = [file for file in list_file if file.startswith("df_")]
-            list_df = []
-            for file in list_file:
-                df = pd.read_pickle(self.path + "/" + file)
-                list_df.append(df)
-            DF = pd.concat(list_df)
-            DF.to_pickle(final_file)
-        DF = pd.read_pickle(final_file)
+    def download_all(
+        self,
+        retry=False,
+        n_workers=1,
+        max_per_host=4,
+        delay=0.5,
+        prom_file=None,
+        n_parsers=0,
+    ):
+        # With n_parsers, the pages are parsed in that many processes
+        if n_parsers:
+            download_all_pipeline(
+                self,
+                retry=retry,
+                n_fetchers=n_workers,
+                n_parsers=n_parsers,
+                max_per_host=max_per_host,
+                delay=delay,
+                prom_file=prom_file,
+            )
+            return
+        download_all_concurrent(
+            self,
+            retry=retry,
+            n_workers=n_workers,
+            max_per_host=max_per_host,
+            delay=delay,
+            prom_file=prom_file,
+        )
+
+    def load_data(self, columns=None, start_date=None, end_date=None):
+        DF = load_dataset(
+            self.path,
+            self.outlet,
+            storage=self.storage,
+            columns=columns,
+            start_date=start_date,
+            end_date=end_date,
+        )
         self.dataframe = DF
         return DF
 
-    def is_COVID_related(self):
-        def check_if_COVID_related(row):
-            """Test if some COVID related keywords are mentioned"""
-            title = row.lower()
-            COVID_keywords = [
-                "covid",
-                "coronavirus",
-                "2019-nCoV",
-                "Covid-19",
-            ]  # "épidémie", "pandémie",
-            COVID_keywords = set([kw.lower() for kw in COVID_keywords])
-            title_words = set(title.split())
-            if COVID_keywords.intersection(title_words):
-                COVID_related = True
-            else:
-                COVID_related = False
-            return COVID_related
-
-        self.dataframe["COVID_related"] = self.dataframe.title.apply(
-            check_if_COVID_related
-        )
+    def is_COVID_related(self, keywords=COVID_KEYWORDS, hits=False):
+        df_covid = classify_titles(self.dataframe.title, keywords=keywords, hits=hits)
+        for column in df_covid.columns:
+            self.dataframe[column] = df_covid[column]
+
+    def load_content_of_COVID_related_papers(self, n_workers=8, batch_size=500):
+        df = load_content(self, n_workers=n_workers, batch_size=batch_size)
+        self.dataframe_COVID_related = df
+        return df
 
 
 class Liberation:
+    # Parser of the archive pages, run in worker processes by the pipeline
+    parser = staticmethod(parse_liberation)
+    columns = ["title", "url"]
 
     def __init__(
-        self, start_date="2020-02-01", end_date="2023-12-31", folder_name="liberation"
+        self,
+        start_date="2020-02-01",
+        end_date="2023-12-31",
+        folder_name="liberation",
+        storage="parquet",
+        cache=True,
+        cache_max_bytes=2 * 1024**3,
     ) -> None:
         # Create a data folder
         self.path = f"data/{folder_name}"
         if not os.path.isdir(self.path):
             os.mkdir(self.path)
         # List of days to itervate over
-        self.list_date = pd.date_range(start="2020-02-01", end="2023-12-31", freq="D")
+        self.list_date = pd.date_range(start=start_date, end=end_date, freq="D")
+        self.outlet = folder_name
+        # Format of the day shards: "parquet" or "pickle"
+        self.storage = storage
+        # Time, bytes and rows of each day crawled, logged by download_all
+        self.metrics = Crawl_Metrics(
+            self.outlet, log_file=f"{self.path}/crawl_metrics.jsonl"
+        )
         self.request_session = requests.Session()
+        # Raw responses are kept under data/http_cache, LRU evicted past max bytes
+        if cache:
+            self.request_session = Cached_Session(
+                self.request_session,
+                max_bytes=cache_max_bytes,
+                mutable=is_recent_archive,
+            )
 
     def get_url(self, date):
         url_base = "https://www.liberation.fr/archives/"
@@ -461,70 +579,73 @@ class Liberation:
         url_full = f"{url_base}/{date_string}"
         return url_full
 
-    def get_papers_one_day(self, date):
+    def fetch_one_day(self, date):
+        """Raw archive pages of a day"""
         url_full = self.get_url(date=date)
         # r = requests.get(url=url_full)
-        r = self.request_session.get(url=url_full)
+        r = self.metrics.get(self.request_session, date, url_full)
         if r.status_code != 200:
             print(url_full)
             raise Warning(f"Status code incorect: {r.status_code}")
-        else:
-            # print(date)
-            soup = BeautifulSoup(r.content, features="lxml")
-            list_article = soup.find_all("article")
-            list_info = []
-            for i, article in enumerate(list_article):
-                url_short = str(article.a.get("href"))
-                url_article = f"https://www.liberation.fr/{url_short}"
-                title_article = article.text
-                list_info.append([title_article, url_article])
-            df = pd.DataFrame(list_info, columns=["title", "url"])
-            df = pd.concat([df], axis=0, keys=[date])
-            date_str = date.strftime("%Y-%m-%d")
-            df.to_pickle(f"{self.path}/df_{date_str}.pkl")
-            return df
-
-    def download_all(self, retry=False):
-        bar = pyprind.ProgBar(len(self.list_date))
-        for date in self.list_date:
-            date_str = date.strftime("%Y-%m-%d")
-            if not os.path.isfile(f"{self.path}/df_{date_str}.pkl"):
-                df = self.get_papers_one_day(date=date)
-            bar.update()
-
-    def load_data(self):
-        final_file = f"{self.path}/DF.pkl"
-        if not os.path.isfile(final_file):
-            list_file = os.listdir(self.path)
-            list_file = [file for file in list_file if file.startswith("df_")]
-            list_df = []
-            for file in list_file:
-                df = pd.read_pickle(self.path + "/" + file)
-                list_df.append(df)
-            DF = pd.concat(list_df)
-            DF.to_pickle(final_file)
-        DF = pd.read_pickle(final_file)
+        return [r.content]
+
+    def get_papers_one_day(self, date):
+        list_content = self.fetch_one_day(date=date)
+        with self.metrics.timer(date, "parse"):
+            df = parse_day(self.parser, self.columns, date, list_content)
+        with self.metrics.timer(date, "write"):
+            save_shard(df, self.path, date, self.storage)
+        self.metrics.add(date, rows=df.shape[0])
+        return df
+
+    def download_all(
+        self,
+        retry=False,
+        n_workers=1,
+        max_per_host=4,
+        delay=0.5,
+        prom_file=None,
+        n_parsers=0,
+    ):
+        # With n_parsers, the pages are parsed in that many processes
+        if n_parsers:
+            download_all_pipeline(
+                self,
+                retry=retry,
+                n_fetchers=n_workers,
+                n_parsers=n_parsers,
+                max_per_host=max_per_host,
+                delay=delay,
+                prom_file=prom_file,
+            )
+            return
+        download_all_concurrent(
+            self,
+            retry=retry,
+            n_workers=n_workers,
+            max_per_host=max_per_host,
+            delay=delay,
+            prom_file=prom_file,
+        )
+
+    def load_data(self, columns=None, start_date=None, end_date=None):
+        DF = load_dataset(
+            self.path,
+            self.outlet,
+            storage=self.storage,
+            columns=columns,
+            start_date=start_date,
+            end_date=end_date,
+        )
         self.dataframe = DF
         return DF
 
-    def is_COVID_related(self):
-        def check_if_COVID_related(row):
-            """Test if some COVID related keywords are mentioned"""
-            title = row.lower()
-            COVID_keywords = [
-                "covid",
-                "coronavirus",
-                "2019-nCoV",
-                "Covid-19",
-            ]  # "épidémie", "pandémie",
-            COVID_keywords = set([kw.lower() for kw in COVID_keywords])
-            title_words = set(title.split())
-            if COVID_keywords.intersection(title_words):
-                COVID_related = True
-            else:
-                COVID_related = False
-            return COVID_related
-
-        self.dataframe["COVID_related"] = self.dataframe.title.apply(
-            check_if_COVID_related
-        )
+    def is_COVID_related(self, keywords=COVID_KEYWORDS, hits=False):
+        df_covid = classify_titles(self.dataframe.title, keywords=keywords, hits=hits)
+        for column in df_covid.columns:
+            self.dataframe[column] = df_covid[column]
+
+    def load_content_of_COVID_related_papers(self, n_workers=8, batch_size=500):
+        df = load_content(self, n_workers=n_workers, batch_size=batch_size)
+        self.dataframe_COVID_related = df
+        return df
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from functions.http_cache import write_file
+
+# Seconds spent in each stage of a day, summed over its pages. fetch is the time
+# on the network only, limiter_wait (slot and politeness delay) and backoff apart
+STAGES = ["fetch", "parse", "write", "limiter_wait", "backoff"]
+# Pages and bytes fetched, attempts (retries included), pages served by the cache
+COUNTS = ["pages", "bytes", "requests", "cache_hits", "cache_bytes", "rows"]
+
+
+class Crawl_Metrics:
+    """Pages, bytes, rows and time per stage of each day crawled for an outlet
+
+    The measures are added from any thread under the date of the day, the
+    record of a day goes to log_file (JSON lines) once the day is done.
+    """
+
+    def __init__(self, outlet, log_file=None) -> None:
+        self.outlet = outlet
+        self.log_file = log_file
+        self.lock = threading.Lock()
+        # Day being fetched by each thread, for the measures of Polite_Session
+        self.local = threading.local()
+        self.start()
+
+    def start(self):
+        """Forget the days measured so far and restart the clock"""
+        with self.lock:
+            self.days = {}
+            self.list_done = []
+            self.list_latency = []
+            self.start_time = time.monotonic()
+
+    def record(self, date):
+        # Called with the lock held
+        date_str = date.strftime("%Y-%m-%d")
+        if date_str not in self.days:
+            self.days[date_str] = {
+                "outlet": self.outlet,
+                "date": date_str,
+                **{count: 0 for count in COUNTS},
+                **{stage: 0.0 for stage in STAGES},
+            }
+        return self.days[date_str]
+
+    def add(self, date, **values):
+        with self.lock:
+            record = self.record(date)
+            for key, value in values.items():
+                record[key] += value
+
+    @contextmanager
+    def timer(self, date, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(date, **{stage: time.perf_counter() - start})
+
+    def get(self, request_session, date, url):
+        """request_session.get(url=url), measured under the date of the day
+
+        A Polite_Session under the cache reports the network time of each
+        attempt through report_network. Without one, the whole call is the
+        request.
+        """
+        self.local.date = date
+        self.local.n_requests = 0
+        start = time.perf_counter()
+        try:
+            r = request_session.get(url=url)
+        finally:
+            self.local.date = None
+        seconds = time.perf_counter() - start
+        with self.lock:
+            record = self.record(date)
+            if getattr(r, "from_cache", False):
+                record["cache_hits"] += 1
+                record["cache_bytes"] += len(r.content)
+                return r
+            record["pages"] += 1
+            record["bytes"] += len(r.content)
+            if not self.local.n_requests:
+                record["requests"] += 1
+                record["fetch"] += seconds
+                self.list_latency.append(seconds)
+        return r
+
+    def report_network(self, latency=None, limiter_wait=0.0, backoff=0.0):
+        """Called by Polite_Session inside get, ignored for other requests"""
+        date = getattr(self.local, "date", None)
+        if date is None:
+            return
+        with self.lock:
+            record = self.record(date)
+            if latency is not None:
+                self.local.n_requests += 1
+                record["requests"] += 1
+                record["fetch"] += latency
+                self.list_latency.append(latency)
+            record["limiter_wait"] += limiter_wait
+            record["backoff"] += backoff
+
+    def done(self, date, error=None):
+        """Close the record of a day and append it to the log"""
+        with self.lock:
+            record = self.record(date)
+            del self.days[record["date"]]
+            record["status"] = "ok" if error is None else "failed"
+            record["error"] = None if error is None else repr(error)
+            record["time"] = pd.Timestamp.now().isoformat(timespec="seconds")
+            self.list_done.append(record)
+            if self.log_file is not None:
+                with open(self.log_file, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def summary(self):
+        """Throughput and p50/p95 network latencies of the days done since start"""
+        with self.lock:
+            df = pd.DataFrame(self.list_done)
+            latency = np.array(self.list_latency)
+            seconds = time.monotonic() - self.start_time
+        summary = {"outlet": self.outlet, "days": len(df), "seconds": seconds}
+        if df.empty:
+            return summary
+        ok = df[df.status == "ok"]
+        summary["failed"] = int((df.status == "failed").sum())
+        for column in COUNTS:
+            summary[column] = int(df[column].sum())
+        # Time not spent on the network, over all the days
+        summary["limiter_wait_seconds"] = float(df.limiter_wait.sum())
+        summary["backoff_seconds"] = float(df.backoff.sum())
+        summary["pages_per_second"] = summary["pages"] / seconds
+        summary["rows_per_second"] = summary["rows"] / seconds
+        if latency.size:
+            summary["latency_p50"] = float(np.percentile(latency, 50))
+            summary["latency_p95"] = float(np.percentile(latency, 95))
+        # Parse and write are timed per day, fetch per request above
+        for stage in ["parse", "write"]:
+            if not ok.empty:
+                summary[f"{stage}_p50"] = float(ok[stage].quantile(0.5))
+                summary[f"{stage}_p95"] = float(ok[stage].quantile(0.95))
+        return summary
+
+    def report(self, prom_file=None):
+        """Print the summary, and write it as a Prometheus textfile if asked"""
+        summary = self.summary()
+        print(
+            " - ".join(
+                f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}"
+                for key, value in summary.items()
+            )
+        )
+        if prom_file is not None:
+            write_prometheus(summary, prom_file)
+        return summary
+
+
+def write_prometheus(summary, prom_file):
+    """Summary in the text format read by the node_exporter textfile collector"""
+    outlet = summary["outlet"]
+    list_line = []
+    for key, value in summary.items():
+        if key == "outlet":
+            continue
+        name = f"archive_crawl_{key}"
+        labels = f'outlet="{outlet}"'
+        if key.endswith(("_p50", "_p95")):
+            name, quantile = f"{name[:-4]}_seconds", int(key[-2:]) / 100
+            labels += f',quantile="{quantile}"'
+        list_line.append(f"{name}{{{labels}}} {value}")
+    # write_file renames a complete file over the old one, as the collector expects
+    write_file(os.path.abspath(prom_file), ("\n".join(list_line) + "\n").encode())
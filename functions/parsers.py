@@ -0,0 +1,303 @@
+import re
+import html
+from lxml import etree
+from bs4 import BeautifulSoup
+from bs4.dammit import EncodingDetector
+
+# Reference parsers: full BeautifulSoup tree, as first written in media.py
+
+
+def soup_france_info(content):
+    soup = BeautifulSoup(content, features="lxml")
+    list_article = soup.find_all("article")
+    list_info = []
+    for i, article in enumerate(list_article):
+        url_article = article.a.get("href")
+        title_article = article.get_text().replace("\n", "").strip()
+        list_info.append([title_article, url_article])
+    return list_info
+
+
+def soup_le_parisien(content):
+    soup = BeautifulSoup(content, features="lxml")
+    list_article = soup.find_all(
+        "div",
+        attrs={"class": "story-preview story-preview--oneline flex-feed-unit"},
+    )
+    list_info = []
+    for i, article in enumerate(list_article):
+        url_article = article.a.get("href").replace("//", "https://")
+        title_article = article.find(attrs={"class": "story-headline"}).text
+        list_info.append([title_article, url_article])
+    return list_info
+
+
+def soup_le_monde(content):
+    soup = BeautifulSoup(content, features="lxml")
+    list_article = soup.find_all("a", attrs={"class": "teaser__link"})
+    list_info = []
+    for i, article in enumerate(list_article):
+        url_article = article.get("href")
+        title_article = str(article.h3.string)
+        description_article = str(article.p.text)
+        list_info.append([title_article, url_article, description_article])
+    return list_info
+
+
+def soup_lexpress(content):
+    soup = BeautifulSoup(content, features="lxml")
+    list_article = soup.find_all("div", attrs={"class": "archives-article__text"})
+    list_info = []
+    for i, article in enumerate(list_article):
+        url_short = str(article.a.get("href"))
+        url_article = f"https://www.lexpress.fr/{url_short}"
+        title_article = str(article.a.text)
+        try:
+            description_article = str(article.p.text)
+        except:
+            description_article = ""
+        list_info.append([title_article, url_article, description_article])
+    return list_info
+
+
+def soup_liberation(content):
+    soup = BeautifulSoup(content, features="lxml")
+    list_article = soup.find_all("article")
+    list_info = []
+    for i, article in enumerate(list_article):
+        url_short = str(article.a.get("href"))
+        url_article = f"https://www.liberation.fr/{url_short}"
+        title_article = article.text
+        list_info.append([title_article, url_article])
+    return list_info
+
+
+def soup_n_page_le_monde(content):
+    soup = BeautifulSoup(content, features="lxml")
+    try:
+        n_page = int(
+            soup.find("link", attrs={"rel": "prev"}).get("href").split("/")[-2]
+        )
+    except:
+        n_page = 1
+    return n_page
+
+
+def soup_n_page_lexpress(content):
+    soup = BeautifulSoup(content, features="lxml")
+    try:
+        n_page = int(soup.find("div", attrs={"class": "paginate paginate_list"}).a.text)
+    except:
+        n_page = 1
+    return n_page
+
+
+def soup_twitter_description(content):
+    soup = BeautifulSoup(content, features="lxml")
+    description = soup.find(attrs={"property": "twitter:description"})
+    return description.attrs["content"]
+
+
+# Fast parsers: lxml tree + XPath, same rows as the reference parsers
+
+# BeautifulSoup leaves the strings of script, style and template out of .text
+TEXT = etree.XPath(
+    ".//text()[not(ancestor::script or ancestor::style or ancestor::template)]"
+)
+# BeautifulSoup turns a string of ASCII spaces into "\n" or " ", except in these
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+PRESERVE_WHITESPACE = etree.XPath("ancestor-or-self::pre or ancestor-or-self::textarea")
+
+
+def has_token(name, attribute="class"):
+    """XPath test matching bs4 attrs={attribute: name} on a multi-valued attribute"""
+    return f"contains(concat(' ', normalize-space(@{attribute}), ' '), ' {name} ')"
+
+
+def page_encoding(content):
+    """Page without its BOM, and the encoding BeautifulSoup decodes it with
+
+    Byte order mark, then declared charset, then detected one, then utf-8.
+    """
+    detector = EncodingDetector(content, is_html=True)
+    return detector.markup, next(detector.encodings)
+
+
+def parse_tree(content):
+    """lxml tree of a page, decoded the way BeautifulSoup decodes it"""
+    content, encoding = page_encoding(content)
+    parser = etree.HTMLParser(encoding=encoding)
+    tree = etree.fromstring(content, parser=parser)
+    # Empty page
+    if tree is None:
+        tree = etree.Element("html")
+    return tree
+
+
+def first(element, path):
+    """Same as bs4 Tag.<name>, failing like None.<attribute> when there is none"""
+    list_element = element.xpath(path)
+    if not list_element:
+        raise AttributeError(f"No element matching {path}")
+    return list_element[0]
+
+
+def collapse(string, element):
+    """String as BeautifulSoup stores it, element being the one that holds it"""
+    if not string or string.strip(ASCII_SPACES) or PRESERVE_WHITESPACE(element):
+        return string
+    return "\n" if "\n" in string else " "
+
+
+def text(element):
+    """Same as bs4 Tag.text"""
+    list_string = []
+    for string in TEXT(element):
+        parent = string.getparent()
+        if string.is_tail:
+            parent = parent.getparent()
+        list_string.append(collapse(string, parent))
+    return "".join(list_string)
+
+
+def string(element):
+    """Same as bs4 Tag.string: the only string below a chain of single children"""
+    children = list(element)
+    if not children:
+        return collapse(element.text, element)
+    if len(children) == 1 and not element.text and not children[0].tail:
+        if children[0].tag is etree.Comment:
+            return collapse(children[0].text, element)
+        return string(children[0])
+    return None
+
+
+def parse_france_info(content):
+    tree = parse_tree(content)
+    list_info = []
+    for article in tree.xpath("//article"):
+        url_article = first(article, ".//a").get("href")
+        title_article = text(article).replace("\n", "").strip()
+        list_info.append([title_article, url_article])
+    return list_info
+
+
+def parse_le_parisien(content):
+    tree = parse_tree(content)
+    list_article = tree.xpath(
+        "//div[normalize-space(@class)="
+        "'story-preview story-preview--oneline flex-feed-unit']"
+    )
+    list_info = []
+    for article in list_article:
+        url_article = first(article, ".//a").get("href").replace("//", "https://")
+        title_article = text(first(article, f".//*[{has_token('story-headline')}]"))
+        list_info.append([title_article, url_article])
+    return list_info
+
+
+def parse_le_monde(content):
+    tree = parse_tree(content)
+    list_info = []
+    for article in tree.xpath(f"//a[{has_token('teaser__link')}]"):
+        url_article = article.get("href")
+        title_article = str(string(first(article, ".//h3")))
+        description_article = str(text(first(article, ".//p")))
+        list_info.append([title_article, url_article, description_article])
+    return list_info
+
+
+def parse_lexpress(content):
+    tree = parse_tree(content)
+    list_info = []
+    for article in tree.xpath(f"//div[{has_token('archives-article__text')}]"):
+        a = first(article, ".//a")
+        url_short = str(a.get("href"))
+        url_article = f"https://www.lexpress.fr/{url_short}"
+        title_article = str(text(a))
+        try:
+            description_article = str(text(first(article, ".//p")))
+        except:
+            description_article = ""
+        list_info.append([title_article, url_article, description_article])
+    return list_info
+
+
+def parse_liberation(content):
+    tree = parse_tree(content)
+    list_info = []
+    for article in tree.xpath("//article"):
+        url_short = str(first(article, ".//a").get("href"))
+        url_article = f"https://www.liberation.fr/{url_short}"
+        title_article = text(article)
+        list_info.append([title_article, url_article])
+    return list_info
+
+
+def parse_n_page_le_monde(content):
+    tree = parse_tree(content)
+    try:
+        link = first(tree, f"//link[{has_token('prev', attribute='rel')}]")
+        n_page = int(link.get("href").split("/")[-2])
+    except:
+        n_page = 1
+    return n_page
+
+
+def parse_n_page_lexpress(content):
+    tree = parse_tree(content)
+    try:
+        paginate = first(
+            tree, "//div[normalize-space(@class)='paginate paginate_list']"
+        )
+        n_page = int(text(first(paginate, ".//a")))
+    except:
+        n_page = 1
+    return n_page
+
+
+def parse_twitter_description(content):
+    tree = parse_tree(content)
+    description = first(tree, "//*[@property='twitter:description']")
+    return description.attrib["content"]
+
+
+# Meta tag scanner: regexes over the <head> only, no tree at all
+
+META = re.compile(r"""<meta\b(?:[^>"']|"[^"]*"|'[^']*')*>""", re.I)
+ATTRIBUTE = re.compile(r"""([^\s=/>]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""")
+
+
+def scan_meta(content):
+    """Attributes of each <meta> tag of a page, or of its head only"""
+    content, encoding = page_encoding(content)
+    text = content.decode(encoding, errors="replace")
+    list_meta = []
+    for tag in META.finditer(text):
+        attributes = {}
+        for name, *values in ATTRIBUTE.findall(tag.group()[5:]):
+            value = "".join(values)
+            attributes.setdefault(name.lower(), html.unescape(value))
+        list_meta.append(attributes)
+    return list_meta
+
+
+def scan_twitter_description(content):
+    for attributes in scan_meta(content):
+        if attributes.get("property") == "twitter:description":
+            return attributes["content"]
+    raise AttributeError("No twitter:description meta tag")
+
+
+PARSERS = {
+    "france_info": (soup_france_info, parse_france_info),
+    "le_parisien": (soup_le_parisien, parse_le_parisien),
+    "le_monde": (soup_le_monde, parse_le_monde),
+    "lexpress": (soup_lexpress, parse_lexpress),
+    "liberation": (soup_liberation, parse_liberation),
+    "n_page_le_monde": (soup_n_page_le_monde, parse_n_page_le_monde),
+    "n_page_lexpress": (soup_n_page_lexpress, parse_n_page_lexpress),
+    "twitter_description": (soup_twitter_description, parse_twitter_description),
+    "head_twitter_description": (soup_twitter_description, scan_twitter_description),
+}
+
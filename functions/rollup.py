@@ -0,0 +1,160 @@
+import os
+import pandas as pd
+from functions.storage import (
+    diff_manifest,
+    list_shards,
+    read_manifest,
+    read_shard,
+    write_manifest,
+)
+from functions.word_trends import count_keywords, resample_freq
+
+
+def day_strings(df):
+    return df.date.dt.strftime("%Y-%m-%d")
+
+
+def rollup_days(DF, keywords):
+    """Documents, characters and keyword counts of each day of a titles frame
+
+    density is the sum over the documents of count / length of the title, so
+    that density / n_docs is the mean that plot_trends draws when normalized.
+    """
+    titles = DF.title.fillna("").astype(str)
+    dates = pd.to_datetime(DF.index.get_level_values(0)).normalize()
+    lengths = titles.str.len().to_numpy()
+    df_days = (
+        pd.DataFrame({"date": dates, "n_docs": 1, "n_chars": lengths})
+        .groupby("date")
+        .sum()
+        .reset_index()
+    )
+    df_counts = count_keywords(titles.tolist(), keywords)
+    list_df = []
+    for keyword in keywords:
+        count = df_counts[keyword.lower()].to_numpy()
+        # Empty titles count for nothing instead of dividing by zero
+        density = count / lengths.clip(min=1)
+        list_df.append(
+            pd.DataFrame(
+                {"date": dates, "keyword": keyword, "count": count, "density": density}
+            )
+        )
+    if not list_df:
+        return df_days, pd.DataFrame(columns=["date", "keyword", "count", "density"])
+    df_keywords = pd.concat(list_df).groupby(["date", "keyword"]).sum().reset_index()
+    return df_days, df_keywords
+
+
+class Daily_Rollup:
+    """Per outlet and day: n_docs, n_chars and the count/density of each keyword
+
+    update follows the day shards through a manifest, and counts a keyword
+    over the whole folder only the first time it is asked for.
+    """
+
+    def __init__(self, root="data/rollups") -> None:
+        self.root = root
+        self.days = None
+
+    def folder(self, outlet):
+        return f"{self.root}/outlet={outlet}"
+
+    def read(self, outlet):
+        folder = self.folder(outlet)
+        if not os.path.isfile(f"{folder}/days.parquet"):
+            return None, None
+        df_days = pd.read_parquet(f"{folder}/days.parquet")
+        df_keywords = pd.read_parquet(f"{folder}/keywords.parquet")
+        return df_days, df_keywords
+
+    def update(self, path, outlet, keywords=()):
+        """Roll up the days whose shard changed, and the keywords not seen yet"""
+        folder = self.folder(outlet)
+        manifest_file = f"{folder}/_manifest.json"
+        shards = list_shards(path)
+        df_days, df_keywords = self.read(outlet)
+        manifest = {} if df_days is None else read_manifest(manifest_file)
+        list_changed, manifest = diff_manifest(shards, manifest)
+        list_known = [] if df_days is None else list(df_keywords.keyword.unique())
+        list_new = [kw for kw in dict.fromkeys(keywords) if kw not in list_known]
+        if not list_changed and not list_new:
+            return list_changed
+        list_days, list_keywords = [], []
+        if df_days is not None:
+            list_days.append(df_days[~day_strings(df_days).isin(list_changed)])
+            list_keywords.append(
+                df_keywords[~day_strings(df_keywords).isin(list_changed)]
+            )
+        # Changed days for every keyword, the other days for the new keywords
+        list_day = [date_str for date_str in list_changed if date_str in shards]
+        if list_day:
+            DF = pd.concat([read_shard(shards[date_str]) for date_str in list_day])
+            df_new_days, df_new_keywords = rollup_days(DF, list_known + list_new)
+            list_days.append(df_new_days)
+            list_keywords.append(df_new_keywords)
+        list_day = [date_str for date_str in shards if date_str not in list_changed]
+        if list_new and list_day:
+            DF = pd.concat([read_shard(shards[date_str]) for date_str in list_day])
+            list_keywords.append(rollup_days(DF, list_new)[1])
+        os.makedirs(folder, exist_ok=True)
+        pd.concat(list_days).sort_values("date").to_parquet(
+            f"{folder}/days.parquet", index=False
+        )
+        pd.concat(list_keywords).sort_values(["date", "keyword"]).to_parquet(
+            f"{folder}/keywords.parquet", index=False
+        )
+        write_manifest(manifest, manifest_file)
+        self.days = None
+        return list_changed
+
+    def load(self):
+        """Daily sums of every outlet in memory, one column per keyword"""
+        self.days, self.counts, self.densities = {}, {}, {}
+        for outlet_folder in sorted(os.listdir(self.root)):
+            outlet = outlet_folder.split("=")[-1]
+            df_days, df_keywords = self.read(outlet)
+            if df_days is None:
+                continue
+            self.days[outlet] = df_days.set_index("date")
+            table = df_keywords.pivot(
+                index="date", columns="keyword", values=["count", "density"]
+            )
+            self.counts[outlet] = table["count"]
+            self.densities[outlet] = table["density"]
+
+    def query(
+        self,
+        keywords,
+        freq="M",
+        normalized=True,
+        outlets=None,
+        start_date=None,
+        end_date=None,
+    ):
+        """Mean count (or count per character of the title) per document and period
+
+        Same values as plot_trends gives from get_counts over the same titles.
+        """
+        if self.days is None:
+            self.load()
+        outlets = list(self.days) if outlets is None else list(outlets)
+        tables = self.densities if normalized else self.counts
+        for outlet in outlets:
+            missing = [kw for kw in keywords if kw not in tables[outlet].columns]
+            if missing:
+                raise Warning(f"{missing} not rolled up for {outlet}, run update")
+        # A day missing from an outlet counts as 0 documents for it
+        n_docs = pd.concat([self.days[o].n_docs for o in outlets], axis=1).sum(axis=1)
+        total = (
+            pd.concat([tables[o][keywords] for o in outlets], keys=outlets)
+            .groupby(level=1)
+            .sum()
+        )
+        n_docs = n_docs.loc[start_date:end_date]
+        total = total.loc[start_date:end_date]
+        freq = resample_freq(freq)
+        df_trend = total.resample(freq).sum().div(n_docs.resample(freq).sum(), axis=0)
+        df_trend.columns.name = None
+        df_trend.index.name = None
+        return df_trend
@@ -0,0 +1,216 @@
+import os
+import json
+import hashlib
+import pandas as pd
+
+PARQUET_ROOT = "data/parquet"
+
+
+def shard_file(path, date, storage="parquet"):
+    date_str = date.strftime("%Y-%m-%d")
+    extension = "pkl" if storage == "pickle" else "parquet"
+    return f"{path}/df_{date_str}.{extension}"
+
+
+def shard_exists(path, date):
+    """A day is downloaded whatever the format of its shard"""
+    return os.path.isfile(shard_file(path, date, "pickle")) or os.path.isfile(
+        shard_file(path, date, "parquet")
+    )
+
+
+def to_flat(df):
+    """Turn the (date, rank) index into columns, as stored in parquet"""
+    return df.rename_axis(["date", "rank"]).reset_index()
+
+
+def from_flat(df):
+    df = df.set_index(["date", "rank"])
+    return df.rename_axis([None, None])
+
+
+def save_shard(df, path, date, storage="parquet"):
+    file = shard_file(path, date, storage)
+    if storage == "pickle":
+        df.to_pickle(file)
+    else:
+        to_flat(df).to_parquet(file, compression="zstd", index=False)
+
+
+def read_shard(file, columns=None):
+    if file.endswith(".pkl"):
+        df = pd.read_pickle(file)
+        return df if columns is None else df[list(columns)]
+    if columns is not None:
+        columns = ["date", "rank"] + list(columns)
+    return from_flat(pd.read_parquet(file, columns=columns))
+
+
+def list_shards(path):
+    """Shard file of each day of a folder (parquet wins over pickle)"""
+    shards = {}
+    for file in sorted(os.listdir(path)):
+        if file.startswith("df_"):
+            date_str = file[3:13]
+            if date_str not in shards or file.endswith(".parquet"):
+                shards[date_str] = f"{path}/{file}"
+    return shards
+
+
+def convert_pickle_shards(path, remove=False):
+    """Rewrite the df_YYYY-MM-DD.pkl shards of a folder as parquet"""
+    for date_str, file in list_shards(path).items():
+        if file.endswith(".pkl"):
+            save_shard(read_shard(file), path, pd.Timestamp(date_str), "parquet")
+            if remove:
+                os.remove(file)
+
+
+def partition_file(outlet, month):
+    return f"{PARQUET_ROOT}/outlet={outlet}/month={month}/part.parquet"
+
+
+def write_partition(df, outlet, month):
+    file = partition_file(outlet, month)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    to_flat(df).to_parquet(file, compression="zstd", index=False)
+
+
+def file_hash(file):
+    with open(file, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def read_manifest(file):
+    if not os.path.isfile(file):
+        return {}
+    with open(file) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, file):
+    with open(f"{file}.tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f"{file}.tmp", file)
+
+
+def diff_manifest(shards, manifest):
+    """Days whose shard is new, changed or gone since the manifest was written"""
+    new_manifest = {}
+    list_changed = []
+    for date_str, file in shards.items():
+        mtime = os.path.getmtime(file)
+        entry = manifest.get(date_str)
+        # Only hash the shards whose mtime moved
+        if entry is not None and entry["file"] == file and entry["mtime"] == mtime:
+            new_manifest[date_str] = entry
+            continue
+        hash = file_hash(file)
+        if entry is None or entry["hash"] != hash:
+            list_changed.append(date_str)
+        new_manifest[date_str] = {"file": file, "mtime": mtime, "hash": hash}
+    list_changed += [date_str for date_str in manifest if date_str not in shards]
+    return list_changed, new_manifest
+
+
+def replace_days(DF, list_changed, shards):
+    """Drop the rows of the changed days and add their current shards"""
+    list_df = []
+    if DF is not None:
+        dates = DF.index.get_level_values(0).strftime("%Y-%m-%d")
+        list_df.append(DF[~dates.isin(list_changed)])
+    for date_str in list_changed:
+        if date_str in shards:
+            list_df.append(read_shard(shards[date_str]))
+    # By date only: rank restarts on every page, pages must stay in order
+    return pd.concat(list_df).sort_index(level=0, sort_remaining=False, kind="stable")
+
+
+def consolidate(path, outlet):
+    """Update the month parquet files with the day shards added since last time"""
+    manifest_file = f"{PARQUET_ROOT}/outlet={outlet}/_manifest.json"
+    shards = list_shards(path)
+    list_changed, manifest = diff_manifest(shards, read_manifest(manifest_file))
+    if not list_changed:
+        return
+    for month in sorted(set(date_str[:7] for date_str in list_changed)):
+        file = partition_file(outlet, month)
+        DF = from_flat(pd.read_parquet(file)) if os.path.isfile(file) else None
+        list_month = [date_str for date_str in list_changed if date_str[:7] == month]
+        DF = replace_days(DF, list_month, shards)
+        if DF.shape[0]:
+            write_partition(DF, outlet, month)
+        elif os.path.isfile(file):
+            os.remove(file)
+    write_manifest(manifest, manifest_file)
+
+
+def read_partitions(outlet, columns=None, start_date=None, end_date=None):
+    """Read the month partitions of an outlet, only the requested columns/dates"""
+    # pyarrow is only needed by the parquet backend
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(
+        f"{PARQUET_ROOT}/outlet={outlet}",
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("month", pa.string())]), flavor="hive"
+        ),
+    )
+    # Month filters prune whole files, date filters are pushed to the row groups
+    filter = None
+    if start_date is not None:
+        start_date = pd.Timestamp(start_date)
+        filter = (ds.field("month") >= start_date.strftime("%Y-%m")) & (
+            ds.field("date") >= start_date
+        )
+    if end_date is not None:
+        end_date = pd.Timestamp(end_date)
+        end_filter = (ds.field("month") <= end_date.strftime("%Y-%m")) & (
+            ds.field("date") <= end_date
+        )
+        filter = end_filter if filter is None else filter & end_filter
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != "month"]
+    else:
+        columns = ["date", "rank"] + list(columns)
+    table = dataset.to_table(columns=columns, filter=filter)
+    DF = from_flat(table.to_pandas())
+    # Rows of a day are in page order in the files, rank alone would mix pages
+    return DF.sort_index(level=0, sort_remaining=False, kind="stable")
+
+
+def load_pickle_dataset(path):
+    """Update DF.pkl with the day shards added since last time"""
+    final_file = f"{path}/DF.pkl"
+    manifest_file = f"{path}/DF_manifest.json"
+    shards = list_shards(path)
+    list_changed, manifest = diff_manifest(shards, read_manifest(manifest_file))
+    if list_changed or not os.path.isfile(final_file):
+        DF = pd.read_pickle(final_file) if os.path.isfile(final_file) else None
+        DF = replace_days(DF, list_changed, shards)
+        DF.to_pickle(final_file)
+        write_manifest(manifest, manifest_file)
+    else:
+        DF = pd.read_pickle(final_file)
+    return DF
+
+
+def load_dataset(
+    path, outlet, storage="parquet", columns=None, start_date=None, end_date=None
+):
+    if storage == "pickle":
+        DF = load_pickle_dataset(path)
+        if start_date is not None or end_date is not None:
+            dates = DF.index.get_level_values(0)
+            start_date = pd.Timestamp(start_date or dates.min())
+            end_date = pd.Timestamp(end_date or dates.max())
+            DF = DF[(dates >= start_date) & (dates <= end_date)]
+        if columns is not None:
+            DF = DF[list(columns)]
+        return DF
+    consolidate(path, outlet)
+    return read_partitions(
+        outlet, columns=columns, start_date=start_date, end_date=end_date
+    )
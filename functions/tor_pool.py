@@ -0,0 +1,131 @@
+import time
+import uuid
+import threading
+import pandas as pd
+import requests
+
+# Answers of a site that blocks the exit node
+BLOCKED_STATUS = [403, 429, 503]
+
+
+class Tor_Circuit:
+    """One Tor circuit: a SOCKS endpoint and its own isolation credentials"""
+
+    def __init__(self, host, port) -> None:
+        self.host = host
+        self.port = port
+        self.in_flight = 0
+        self.n_requests = 0
+        self.n_failures = 0
+        self.n_rotations = 0
+        self.new_credentials()
+
+    def new_credentials(self):
+        # Tor gives each SOCKS username/password its own circuit (IsolateSOCKSAuth)
+        self.credentials = uuid.uuid4().hex
+        proxy = f"socks5h://{self.credentials}:tor@{self.host}:{self.port}"
+        self.proxies = {"http": proxy, "https": proxy}
+        self.since_rotation = 0
+        self.consecutive_failures = 0
+        self.latency = None
+
+
+class Tor_Pool:
+    """Spread requests over several Tor circuits, drop-in for RequestsTor.get
+
+    Each request goes to the circuit with the fewest requests in flight, then
+    the lowest latency. A circuit gets a new identity every
+    rotate_every requests, or after max_failures blocked answers in a row.
+    """
+
+    def __init__(
+        self,
+        ports=(9050,),
+        host="localhost",
+        circuits_per_port=4,
+        rotate_every=100,
+        max_failures=2,
+        control_port=None,
+        password=None,
+    ) -> None:
+        # requests_tor loads stem, only needed once a pool is built
+        from requests_tor import TOR_HEADERS
+
+        self.circuits = [
+            Tor_Circuit(host, port) for port in ports for i in range(circuits_per_port)
+        ]
+        self.rotate_every = rotate_every
+        self.max_failures = max_failures
+        self.host = host
+        self.control_port = control_port
+        self.password = password
+        self.session = requests.Session()
+        self.session.headers.update(TOR_HEADERS)
+        self.lock = threading.Lock()
+
+    def pick(self):
+        with self.lock:
+            circuit = min(self.circuits, key=lambda c: (c.in_flight, c.latency or 0))
+            circuit.in_flight += 1
+        return circuit
+
+    def get(self, url, **kwargs):
+        circuit = self.pick()
+        start = time.monotonic()
+        try:
+            r = self.session.get(url, proxies=circuit.proxies, **kwargs)
+        except requests.RequestException:
+            self.report(circuit, None, time.monotonic() - start)
+            raise
+        self.report(circuit, r.status_code, time.monotonic() - start)
+        return r
+
+    def report(self, circuit, status_code, latency):
+        with self.lock:
+            circuit.in_flight -= 1
+            circuit.n_requests += 1
+            circuit.since_rotation += 1
+            if circuit.latency is None:
+                circuit.latency = latency
+            else:
+                circuit.latency = 0.8 * circuit.latency + 0.2 * latency
+            if status_code is None or status_code in BLOCKED_STATUS:
+                circuit.n_failures += 1
+                circuit.consecutive_failures += 1
+            else:
+                circuit.consecutive_failures = 0
+            blocked = circuit.consecutive_failures >= self.max_failures
+            if blocked or circuit.since_rotation >= self.rotate_every:
+                circuit.new_credentials()
+                circuit.n_rotations += 1
+
+    def new_identity(self):
+        """NEWNYM on the Tor control port: new circuits for every credential"""
+        from stem import Signal
+        from stem.control import Controller
+
+        with Controller.from_port(address=self.host, port=self.control_port) as c:
+            c.authenticate(password=self.password)
+            c.signal(Signal.NEWNYM)
+        with self.lock:
+            for circuit in self.circuits:
+                circuit.new_credentials()
+                circuit.n_rotations += 1
+
+    def stats(self):
+        """Requests, failures, rotations and latency of each circuit"""
+        list_stat = []
+        with self.lock:
+            for circuit in self.circuits:
+                list_stat.append(
+                    [
+                        circuit.port,
+                        circuit.credentials,
+                        circuit.n_requests,
+                        circuit.n_failures,
+                        circuit.n_rotations,
+                        circuit.latency,
+                    ]
+                )
+        columns = ["port", "credentials", "requests", "failures", "rotations"]
+        return pd.DataFrame(list_stat, columns=columns + ["latency"])
@@ -0,0 +1,220 @@
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from functions.storage import (
+    diff_manifest,
+    list_shards,
+    read_manifest,
+    read_shard,
+    write_manifest,
+)
+
+# Subplot title -> data folder of the outlets drawn on each image
+OUTLETS = {
+    "France_Info": "france_info",
+    "Le_Parisien": "le_parisien",
+    "Lexpress": "lexpress",
+    "Liberation": "liberation",
+}
+# Tokens of WordCloud.process_text, on lower case titles
+WORD = re.compile(r"\w[\w']*")
+FRENCH_STOPWORDS = set(
+    """
+    a à ai au aux avec ce ces cet cette dans de des du elle elles en est et eux il
+    ils je la le les leur leurs lui ma mais me même mes moi mon ne ni nos notre
+    nous on ont ou où par pas pour qu que qui sa se ses si son sont sur ta te tes
+    toi ton tu un une vos votre vous y été être avoir fait sans sous comme
+    dont quand tout tous très bien aussi
+    """.split()
+)
+
+
+def tokenize(title):
+    words = WORD.findall(title.lower())
+    words = [word[:-2] if word.endswith("'s") else word for word in words]
+    return [word for word in words if not word.isdigit()]
+
+
+def count_tokens(titles, stopwords=FRENCH_STOPWORDS):
+    """Counts of the words and of the pairs of consecutive words of the titles
+
+    Pairs are counted within a title, as "word1 word2", and only when neither
+    word is a stopword, as WordCloud does before looking for collocations.
+    """
+    counts = Counter()
+    for title in titles:
+        words = tokenize(title)
+        counts.update(
+            f"{word1} {word2}"
+            for word1, word2 in zip(words, words[1:])
+            if word1 not in stopwords and word2 not in stopwords
+        )
+        counts.update(word for word in words if word not in stopwords)
+    return pd.Series(counts, dtype="int64").rename_axis("token").rename("count")
+
+
+def merge_counts(list_counts):
+    """Sum of frequency tables, e.g. several months into one"""
+    list_counts = [counts for counts in list_counts if not counts.empty]
+    if not list_counts:
+        return pd.Series(dtype="int64", name="count")
+    return pd.concat(list_counts).groupby(level=0).sum()
+
+
+def merge_plurals(counts):
+    """Add the count of "words" to "word" when both are there (not "...ss")"""
+    counts = dict(counts)
+    standard_form = {word: word for word in counts}
+    for word in list(counts):
+        if word.endswith("s") and not word.endswith("ss") and word[:-1] in counts:
+            counts[word[:-1]] += counts.pop(word)
+            standard_form[word] = word[:-1]
+    return counts, standard_form
+
+
+def cloud_frequencies(counts, collocation_threshold=30):
+    """Frequencies WordCloud.process_text would give: plurals merged, collocations
+
+    Same steps as wordcloud.tokenization.unigrams_and_bigrams, from the counts
+    instead of the words, so that merged tables give the words of the union.
+    """
+    from wordcloud.tokenization import score
+
+    if counts.empty:
+        return {}
+    is_pair = counts.index.str.contains(" ")
+    n_words = int(counts[~is_pair].sum())
+    counts_words, standard_form = merge_plurals(counts[~is_pair])
+    counts_pairs, _ = merge_plurals(counts[is_pair])
+    original_counts = counts_words.copy()
+    for pair, count in counts_pairs.items():
+        word1, word2 = (standard_form[word] for word in pair.split(" "))
+        collocation = score(
+            count, original_counts[word1], original_counts[word2], n_words
+        )
+        if collocation > collocation_threshold:
+            counts_words[word1] -= count
+            counts_words[word2] -= count
+            counts_words[pair] = count
+    return {word: count for word, count in counts_words.items() if count > 0}
+
+
+class Word_Frequencies:
+    """Token counts of the titles of each outlet and month, kept on disk"""
+
+    def __init__(self, root="data/wordcloud") -> None:
+        self.root = root
+
+    def table_file(self, outlet, month):
+        return f"{self.root}/outlet={outlet}/{month}.parquet"
+
+    def update(self, path, outlet, stopwords=FRENCH_STOPWORDS):
+        """Count again the months of a folder whose day shards changed
+
+        The stopwords are applied when counting, tables counted with other
+        stopwords have to be removed to be counted again.
+        """
+        manifest_file = f"{self.root}/outlet={outlet}/_manifest.json"
+        shards = list_shards(path)
+        list_changed, manifest = diff_manifest(shards, read_manifest(manifest_file))
+        list_month = sorted(set(date_str[:7] for date_str in list_changed))
+        os.makedirs(f"{self.root}/outlet={outlet}", exist_ok=True)
+        for month in list_month:
+            list_title = []
+            for date_str, file in sorted(shards.items()):
+                if date_str[:7] == month:
+                    list_title += read_shard(file).title.fillna("").tolist()
+            file = self.table_file(outlet, month)
+            if list_title:
+                counts = count_tokens(list_title, stopwords=stopwords)
+                counts.to_frame().to_parquet(file)
+            elif os.path.isfile(file):
+                os.remove(file)
+        write_manifest(manifest, manifest_file)
+        return list_month
+
+    def months(self, outlet):
+        folder = f"{self.root}/outlet={outlet}"
+        if not os.path.isdir(folder):
+            return []
+        return sorted(
+            file[: -len(".parquet")]
+            for file in os.listdir(folder)
+            if file.endswith(".parquet")
+        )
+
+    def read(self, outlet, month):
+        file = self.table_file(outlet, month)
+        if not os.path.isfile(file):
+            return pd.Series(dtype="int64", name="count")
+        return pd.read_parquet(file)["count"]
+
+
+def render_image(title, dict_counts, file, collocation_threshold=30):
+    """One word cloud per outlet on a 2 columns grid, saved as a png"""
+    from matplotlib.figure import Figure
+    from wordcloud import WordCloud
+
+    n_rows = (len(dict_counts) + 1) // 2
+    fig = Figure(figsize=(15, 4.5 * n_rows))
+    fig.suptitle(title)
+    for i, (outlet_title, counts) in enumerate(dict_counts.items()):
+        ax = fig.add_subplot(n_rows, 2, i + 1)
+        ax.set_title(outlet_title)
+        ax.axis("off")
+        frequencies = cloud_frequencies(counts, collocation_threshold)
+        if frequencies:
+            cloud = WordCloud(colormap="rainbow").generate_from_frequencies(frequencies)
+            ax.imshow(cloud, interpolation="bilinear")
+    fig.savefig(file, bbox_inches="tight")
+    return file
+
+
+def update_wordclouds(
+    outlets=OUTLETS,
+    folder="wordcloud",
+    aggregate="2020-2024",
+    root="data/wordcloud",
+    n_workers=4,
+):
+    """Render the images of the months whose shards changed, and the aggregate
+
+    The aggregate image sums the monthly tables, the titles are not read again.
+    """
+    frequencies = Word_Frequencies(root=root)
+    set_month = set()
+    for outlet in outlets.values():
+        set_month.update(frequencies.update(f"data/{outlet}", outlet))
+    all_months = sorted(
+        set().union(*(frequencies.months(outlet) for outlet in outlets.values()))
+    )
+    # A month also needs an image if its png is missing
+    list_month = [
+        month
+        for month in all_months
+        if month in set_month or not os.path.isfile(f"{folder}/{month}.png")
+    ]
+    list_job = []
+    for month in list_month:
+        dict_counts = {
+            outlet_title: frequencies.read(outlet, month)
+            for outlet_title, outlet in outlets.items()
+        }
+        list_job.append((month, dict_counts, f"{folder}/{month}.png"))
+    aggregate_file = f"{folder}/{aggregate}.png"
+    if set_month or not os.path.isfile(aggregate_file):
+        dict_counts = {}
+        for outlet_title, outlet in outlets.items():
+            list_counts = [
+                frequencies.read(outlet, month) for month in frequencies.months(outlet)
+            ]
+            dict_counts[outlet_title] = merge_counts(list_counts)
+        list_job.append((aggregate, dict_counts, aggregate_file))
+    if not list_job:
+        return []
+    os.makedirs(folder, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        list_file = list(executor.map(render_image, *zip(*list_job)))
+    return list_file
@@ -1,29 +1,130 @@
+import re
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+# Month end frequency: "M" until pandas 2.2, "ME" after
+try:
+    MONTH = pd.tseries.frequencies.to_offset("ME").freqstr
+except ValueError:
+    MONTH = "M"
+
+def resample_freq(freq):
+    return MONTH if freq in ["M", "ME"] else freq
+
 def get_count(row, keyword, normalized=True):
     count = row.lower().count(keyword.lower())
     if normalized:
         count = count / len(row)
     return count
 
+def trie_pattern(keywords):
+    """Regex of the keywords factored by common prefix, longest match first"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def to_pattern(node):
+        branches = [
+            re.escape(char) + to_pattern(child) for char, child in node.items() if char
+        ]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # An optional tail is tried before stopping, so the longest keyword wins
+        return f"(?:{pattern})?" if "" in node else pattern
+    return to_pattern(trie)
+
+def count_keywords(texts, keywords):
+    """Same counts as row.lower().count(keyword) for every keyword, in one scan"""
+    texts = [text.lower() for text in texts]
+    patterns = sorted(set(kw.lower() for kw in keywords), key=len, reverse=True)
+    if not patterns:
+        return pd.DataFrame(index=range(len(texts)))
+    # Where a keyword matches, the keywords that are its prefixes match too
+    prefixes = {p: [q for q in patterns if p.startswith(q)] for p in patterns}
+    regex = re.compile(f"(?=({trie_pattern(patterns)}))")
+    corpus = "\x00".join(texts)
+    starts = np.cumsum([0] + [len(text) + 1 for text in texts[:-1]])
+    list_position, list_pattern = [], []
+    last_end = {p: 0 for p in patterns}
+    for match in regex.finditer(corpus):
+        position = match.start()
+        for pattern in prefixes[match.group(1)]:
+            # str.count skips overlapping occurrences
+            if position >= last_end[pattern]:
+                last_end[pattern] = position + len(pattern)
+                list_position.append(position)
+                list_pattern.append(pattern)
+    df_match = pd.DataFrame(
+        {
+            "doc": np.searchsorted(starts, list_position, side="right") - 1,
+            "keyword": list_pattern,
+        }
+    )
+    df_counts = df_match.groupby(["doc", "keyword"]).size().unstack(fill_value=0)
+    df_counts = df_counts.reindex(
+        index=range(len(texts)), columns=patterns, fill_value=0
+    )
+    return df_counts
+
 def get_counts(df , keywords, normalized=True):
-    df_trend = pd.DataFrame()
+    df_counts = count_keywords(df, keywords)
+    lengths = np.array([len(row) for row in df])
+    df_trend = pd.DataFrame(index=df.index)
     for keyword in keywords:
-        df_trend[keyword] = df.apply(
-            lambda x: get_count(x, keyword=keyword, normalized=normalized))
-    df_trend.index = df.index
+        count = df_counts[keyword.lower()].to_numpy()
+        if normalized:
+            count = count / lengths
+        df_trend[keyword] = count
     return df_trend
 
-def plot_trends(df_trend):
+def plot_area(df_period):
     fig, ax = plt.subplots(figsize=(12, 3))
-    df_trend.resample("M").mean().plot(ax=ax, alpha=0.4, kind="area", stacked=True)
+    df_period.plot(ax=ax, alpha=0.4, kind="area", stacked=True)
     ax.set_ylabel("Indice d'occurence")
     ax.set_title("Evolution de l'occurence des termes")
     return fig, ax
 
-def analyse_trends(df, keywords, normalized=True):
-    df_trend = get_counts(df, keywords, normalized=normalized)
-    fig, ax = plot_trends(df_trend)
+def plot_trends(df_trend, freq="M"):
+    return plot_area(df_trend.resample(resample_freq(freq)).mean())
+
+def analyse_trends(
+    df,
+    keywords,
+    normalized=True,
+    index=None,
+    rollup=None,
+    freq="M",
+    outlets=None,
+    start_date=None,
+    end_date=None,
+):
+    """With a Headline_Index the counts come from the index and df can be None
+
+    With a Daily_Rollup the periods come from the daily aggregates on disk,
+    without counting the titles again. A Chunked_Corpus counts them chunk by
+    chunk instead, for archives that do not fit in memory.
+    """
+    if rollup is not None:
+        df_period = rollup.query(
+            keywords,
+            freq=freq,
+            normalized=normalized,
+            outlets=outlets,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        return plot_area(df_period)
+    if index is not None:
+        df_trend = index.get_counts(keywords, normalized=normalized, outlets=outlets)
+    else:
+        df_trend = get_counts(df, keywords, normalized=normalized)
+    # Outlets (and days updated in the index) follow each other, not sorted
+    df_trend = df_trend.sort_index(kind="stable").loc[start_date:end_date]
+    fig, ax = plot_trends(df_trend, freq=freq)
     return fig, ax
 
@@ -0,0 +1,94 @@
+"""Chunked_Corpus gives the results of the in-memory path over load_corpus
+
+    python -m pytest tests
+"""
+import os
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import pytest
+from functions.benchmark import synthetic_day
+from functions.chunked import Chunked_Corpus
+from functions.corpus import load_corpus
+from functions.covid import classify_titles
+from functions.storage import save_shard
+from functions.word_trends import get_counts, resample_freq
+
+KEYWORDS = ["covid", "confinement", "la", "vaccin"]
+# 1 row: one day per chunk, None: the whole outlet in one chunk
+LIST_MAX_ROWS = [1, 500, None]
+
+
+@pytest.fixture(scope="module")
+def list_media(tmp_path_factory):
+    """Two outlets (parquet and pickle shards) with days missing and empty titles"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("archive"))
+    list_media = []
+    for k, storage in enumerate(["parquet", "pickle"]):
+        media = SimpleNamespace(
+            outlet=f"outlet_{k}", path=f"data/outlet_{k}", storage=storage
+        )
+        os.makedirs(media.path)
+        for i, date in enumerate(pd.date_range("2020-01-25", "2020-04-10")):
+            if (i + k) % 11 == 0:
+                continue
+            df = synthetic_day(date, 50 + (i * 7 + k) % 90, seed=i * 3 + k)
+            if i % 13 == 0:
+                df.iloc[0, 0] = ""
+            save_shard(df, media.path, date, storage)
+        list_media.append(media)
+    yield list_media
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope="module")
+def DF(list_media):
+    return load_corpus(list_media, columns=["title"])
+
+
+def chunked(list_media, max_rows):
+    return Chunked_Corpus(list_media, max_rows=max_rows or 10**9)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("max_rows", LIST_MAX_ROWS)
+@pytest.mark.parametrize("normalized", [True, False])
+@pytest.mark.parametrize("freq", ["M", "W", "D"])
+@pytest.mark.parametrize("window", [(None, None), ("2020-02", "2020-03-15")])
+def test_query(list_media, DF, max_rows, normalized, freq, window):
+    start_date, end_date = window
+    expected = get_counts(DF.title, KEYWORDS, normalized=normalized)
+    expected = expected.loc[start_date:end_date].resample(resample_freq(freq)).mean()
+    result = chunked(list_media, max_rows).query(
+        KEYWORDS, freq, normalized, start_date=start_date, end_date=end_date
+    )
+    assert list(result.index) == list(expected.index)
+    assert list(result.columns) == list(expected.columns)
+    if normalized:
+        # Same values, summed in another order
+        assert np.allclose(result, expected, rtol=1e-12, atol=0, equal_nan=True)
+    else:
+        pd.testing.assert_frame_equal(
+            result, expected, check_freq=False, check_names=False, rtol=0, atol=0
+        )
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_query_outlets(list_media, DF):
+    expected = get_counts(DF[DF.outlet == "outlet_0"].title, KEYWORDS)
+    expected = expected.resample(resample_freq("M")).mean()
+    result = chunked(list_media, 300).query(KEYWORDS, outlets=["outlet_0"])
+    assert np.allclose(result, expected, rtol=1e-12, atol=0, equal_nan=True)
+
+
+@pytest.mark.parametrize("max_rows", LIST_MAX_ROWS)
+@pytest.mark.parametrize("hits", [False, True])
+def test_covid(list_media, DF, max_rows, hits):
+    df_covid = classify_titles(DF.title, hits=hits).astype("int64")
+    df_covid.insert(0, "n_docs", 1)
+    expected = df_covid.groupby([DF.outlet.astype(str), DF.index]).sum()
+    result = chunked(list_media, max_rows).covid(hits=hits)
+    assert list(result.index) == list(expected.index)
+    assert list(result.columns) == list(expected.columns)
+    assert (result.to_numpy() == expected.to_numpy()).all()
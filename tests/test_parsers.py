@@ -0,0 +1,95 @@
+"""The fast parsers give the same rows as the BeautifulSoup ones
+
+    python -m pytest tests
+"""
+import os
+import pytest
+from functions.parsers import PARSERS
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures")
+TITLE = "Covid : l'été à l'hôpital"
+# Markup of every outlet on one page, so that each parser finds its rows
+PAGE = """<html><head>{meta}
+<link rel="prev" href="https://www.lemonde.fr/archives-du-monde/16-03-2020/4/">
+<meta property="twitter:description" content="{description}">
+</head><body>
+<article><a href="/sante/covid.html">{title}</a></article>
+<div class="story-preview story-preview--oneline flex-feed-unit">
+  <a href="//www.leparisien.fr/covid"><span class="story-headline">{title}</span></a>
+</div>
+<a class="teaser__link" href="https://www.lemonde.fr/covid"><h3>{title}</h3>
+  <p>{description}</p></a>
+<div class="archives-article__text"><a href="sante/covid">{title}</a>
+  <p>{description}</p></div>
+<div class="paginate paginate_list"><a>7</a></div>
+</body></html>"""
+EDGE_CASES = {
+    "plain": {},
+    "nested_link": {"title": f"<b>Covid</b> : <a href='/x'><i>{TITLE}</i></a>"},
+    "comment": {"title": f"<!-- une -->{TITLE}<!-- fin -->"},
+    "only_comment": {"title": "<!-- vide -->"},
+    "script": {"title": f"{TITLE}<script>var n = 1;</script><style>b{{}}</style>"},
+    "indented": {"title": f"\n    <span>\n      {TITLE}\n    </span>\n  "},
+    "entities": {"title": "Covid &amp; grippe &eacute;t&eacute; &#8217;"},
+    "empty_title": {"title": ""},
+}
+HTTP_EQUIV = '<meta http-equiv="Content-Type" content="text/html; charset=cp1252">'
+
+
+def outcome(parser, content):
+    """Rows of a parser, or the type of the error it raised"""
+    try:
+        return parser(content)
+    except Exception as error:
+        return type(error).__name__
+
+
+def page(title=TITLE, description="Le point sur l'épidémie", meta=""):
+    return PAGE.format(title=title, description=description, meta=meta)
+
+
+def check(name, content):
+    soup_parser, fast_parser = PARSERS[name]
+    assert outcome(fast_parser, content) == outcome(soup_parser, content)
+
+
+@pytest.mark.parametrize("name", PARSERS)
+@pytest.mark.parametrize("fixture", sorted(os.listdir(FIXTURES)))
+def test_fixtures(name, fixture):
+    with open(os.path.join(FIXTURES, fixture), "rb") as f:
+        check(name, f.read())
+
+
+@pytest.mark.parametrize("name", PARSERS)
+@pytest.mark.parametrize("case", EDGE_CASES)
+def test_edge_cases(name, case):
+    check(name, page(**EDGE_CASES[case]).encode("utf-8"))
+
+
+@pytest.mark.parametrize("name", PARSERS)
+@pytest.mark.parametrize(
+    "encoding, meta",
+    [
+        ("utf-8", ""),
+        ("latin-1", '<meta charset="iso-8859-1">'),
+        ("latin-1", ""),
+        ("cp1252", HTTP_EQUIV),
+        ("cp1252", ""),
+    ],
+)
+def test_encodings(name, encoding, meta):
+    # Without a charset, both have to guess the same encoding
+    title = f"{TITLE} “œuvre”" if encoding == "cp1252" else TITLE
+    check(name, page(title=title, meta=meta).encode(encoding))
+
+
+@pytest.mark.parametrize("name", PARSERS)
+def test_missing_nodes(name):
+    content = page().replace("<a ", "<span ").replace("<p>", "<i>").encode("utf-8")
+    check(name, content)
+
+
+@pytest.mark.parametrize("name", PARSERS)
+@pytest.mark.parametrize("content", [b"", b"<html></html>", b"pas de html"])
+def test_empty_pages(name, content):
+    check(name, content)
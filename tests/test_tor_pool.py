@@ -0,0 +1,103 @@
+"""Tor_Pool spreads the requests over its circuits and rotates them
+
+A fake session stands in for the SOCKS endpoints: it answers with the status
+given for the port of the proxy, and records the proxy of each request.
+
+    python -m pytest tests
+"""
+import pytest
+from functions.http_cache import make_response
+from functions.tor_pool import Tor_Pool
+
+pytest.importorskip("requests_tor")
+
+
+class Fake_Session:
+    def __init__(self, status=None) -> None:
+        # Port -> status code, 200 for the others
+        self.status = status or {}
+        self.list_proxy = []
+
+    def get(self, url, proxies=None, **kwargs):
+        proxy = proxies["https"]
+        self.list_proxy.append(proxy)
+        port = int(proxy.rsplit(":", 1)[1])
+        return make_response(url, self.status.get(port, 200), b"ok", {})
+
+
+def make_pool(status=None, **kwargs):
+    pool = Tor_Pool(**kwargs)
+    pool.session = Fake_Session(status)
+    return pool
+
+
+def test_proxies():
+    pool = make_pool(ports=(9050, 9052), circuits_per_port=2)
+    for i in range(4):
+        pool.get("https://www.lemonde.fr/")
+    # One request per circuit, each through its own SOCKS credentials
+    assert sorted(pool.session.list_proxy) == sorted(
+        circuit.proxies["https"] for circuit in pool.circuits
+    )
+    assert all(
+        proxy.startswith("socks5h://") and proxy.endswith((":9050", ":9052"))
+        for proxy in pool.session.list_proxy
+    )
+
+
+def test_spread_by_in_flight():
+    pool = make_pool(ports=(9050, 9052), circuits_per_port=2)
+    list_circuit = [pool.pick() for i in range(4)]
+    # No circuit gets a second request while another one has none
+    assert len(set(map(id, list_circuit))) == 4
+    assert all(circuit.in_flight == 1 for circuit in pool.circuits)
+    fifth = pool.pick()
+    assert fifth.in_flight == 2
+    # Once done, a circuit with fewer requests in flight comes first
+    pool.report(list_circuit[2], 200, 0.1)
+    assert pool.pick() is list_circuit[2]
+
+
+def test_spread_by_latency():
+    pool = make_pool(ports=(9050,), circuits_per_port=3)
+    for circuit, latency in zip(pool.circuits, [0.5, 0.1, 0.9]):
+        circuit.in_flight += 1
+        pool.report(circuit, 200, latency)
+    # Same number in flight: the fastest circuit
+    assert pool.pick() is pool.circuits[1]
+
+
+def test_rotate_after_failures():
+    pool = make_pool({9050: 429}, ports=(9050,), circuits_per_port=1, max_failures=2)
+    circuit = pool.circuits[0]
+    credentials = circuit.credentials
+    pool.get("https://www.lemonde.fr/")
+    assert circuit.credentials == credentials
+    pool.get("https://www.lemonde.fr/")
+    assert circuit.credentials != credentials
+    assert (circuit.n_failures, circuit.n_rotations) == (2, 1)
+    assert circuit.consecutive_failures == 0
+
+
+def test_failures_not_in_a_row():
+    pool = make_pool(ports=(9050,), circuits_per_port=1, max_failures=2)
+    circuit = pool.circuits[0]
+    credentials = circuit.credentials
+    for status in [503, 200, 403, 200, None]:
+        pool.report(pool.pick(), status, 0.1)
+    # A connection error (None) counts as a failure too, but never 2 in a row
+    assert circuit.n_failures == 3
+    assert circuit.credentials == credentials
+
+
+def test_rotate_every():
+    pool = make_pool(ports=(9050,), circuits_per_port=1, rotate_every=3)
+    circuit = pool.circuits[0]
+    list_credentials = []
+    for i in range(7):
+        list_credentials.append(circuit.credentials)
+        pool.get("https://www.lemonde.fr/")
+    assert circuit.n_rotations == 2
+    assert len(set(list_credentials[:3])) == 1
+    assert len(set(list_credentials[3:6])) == 1
+    assert len(set(list_credentials)) == 3
@@ -0,0 +1,63 @@
+"""count_keywords/get_counts give the counts of the per keyword get_count
+
+    python -m pytest tests
+"""
+import pandas as pd
+import pytest
+from functions.word_trends import count_keywords, get_count, get_counts
+
+TITLES = [
+    "Covid-19 : le COVID recule, la covid-19 aussi",
+    "Coronavirus et coronavirus, corona",
+    "aaaa aaa",
+    "Vaccin : la vaccination des vaccinés",
+    "Rien à voir",
+    "covidcovid covid",
+]
+KEYWORDS = {
+    "overlapping": ["covid", "covid-19", "19 :", "-19"],
+    "prefixes": ["co", "cor", "corona", "coronavirus", "vaccin", "vaccination"],
+    "repeated_letters": ["a", "aa", "aaa"],
+    "mixed_case": ["COVID", "covid", "Coronavirus", "vAcCiN"],
+    "absent": ["ukraine"],
+}
+
+
+def reference(titles, keywords, normalized):
+    """One pass of get_count per keyword, as before count_keywords"""
+    df_trend = pd.DataFrame(index=titles.index)
+    for keyword in keywords:
+        df_trend[keyword] = titles.apply(get_count, args=(keyword, normalized))
+    return df_trend
+
+
+@pytest.mark.parametrize("normalized", [True, False])
+@pytest.mark.parametrize("case", KEYWORDS)
+def test_get_counts(case, normalized):
+    titles = pd.Series(TITLES, index=pd.date_range("2020-03-01", periods=len(TITLES)))
+    keywords = KEYWORDS[case]
+    pd.testing.assert_frame_equal(
+        get_counts(titles, keywords, normalized=normalized),
+        reference(titles, keywords, normalized),
+    )
+
+
+def test_count_keywords():
+    keywords = sum(KEYWORDS.values(), [])
+    df_counts = count_keywords(TITLES, keywords)
+    for keyword in keywords:
+        expected = [title.lower().count(keyword.lower()) for title in TITLES]
+        assert df_counts[keyword.lower()].tolist() == expected
+
+
+def test_empty_input():
+    assert count_keywords([], ["covid"]).shape == (0, 1)
+    assert count_keywords(TITLES, []).shape == (len(TITLES), 0)
+    titles = pd.Series([], dtype=object)
+    assert get_counts(titles, ["covid"]).empty
+    # Empty titles: 0 hits (normalized, get_count divides by a length of 0)
+    titles = pd.Series(["", "covid", ""])
+    pd.testing.assert_frame_equal(
+        get_counts(titles, ["covid", "co"], normalized=False),
+        reference(titles, ["covid", "co"], normalized=False),
+    )